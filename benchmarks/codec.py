@@ -0,0 +1,76 @@
+# pylint: disable=W0621
+"""Benchmark the binary codec for reading streams."""
+
+import json
+import random
+import time
+from dataclasses import asdict
+
+from cemm import SmartMeter, StreamDecoder, StreamEncoder
+
+READINGS = 100_000
+
+
+def smartmeter_stream(count: int) -> list[SmartMeter]:
+    """Create a realistic stream of smart meter readings, one every second."""
+    readings = []
+    timestamp = 1632948526000
+    consumption = 5237.19
+    for index in range(count):
+        power = random.randint(150, 450)  # noqa: S311 # nosec
+        consumption = round(consumption + power / 3_600_000, 2)
+        # Devices report the tariff period as a number, like the fixtures.
+        tariff = 2 if index % 86400 > 25200 else 1
+        reading = SmartMeter(
+            power_flow=power,
+            gas_consumption=6064.06,
+            energy_tariff_period=tariff,  # type: ignore[arg-type]
+            energy_consumption_low=consumption,
+            energy_consumption_high=5459.44,
+            energy_returned_low=2190.41,
+            energy_returned_high=5012.44,
+            billed_energy_low=3046.78,
+            billed_energy_high=447,
+        )
+        reading.timestamps = {
+            name: timestamp
+            if name != "gas_consumption"
+            else timestamp - timestamp % 300_000
+            for name in asdict(reading)
+            if name != "timestamps"
+        }
+        readings.append(reading)
+        timestamp += 1000
+    return readings
+
+
+def main() -> None:
+    """Print encode and decode throughput and the compression ratio."""
+    readings = smartmeter_stream(READINGS)
+
+    start = time.perf_counter()
+    encoder = StreamEncoder(SmartMeter)
+    data = b"".join(encoder.encode(reading) for reading in readings)
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decoded = StreamDecoder().feed(data)
+    decode_time = time.perf_counter() - start
+    assert decoded == readings  # noqa: S101 # nosec
+    assert [reading.timestamps for reading in decoded] == [  # noqa: S101 # nosec
+        reading.timestamps for reading in readings
+    ]
+
+    as_json = "\n".join(json.dumps(asdict(reading)) for reading in readings)
+    print(f"Readings:      {READINGS}")
+    print(f"Encode:        {READINGS / encode_time:,.0f} readings/s")
+    print(f"Decode:        {READINGS / decode_time:,.0f} readings/s")
+    print(f"JSON size:     {len(as_json.encode()):,} bytes")
+    print(
+        f"Encoded size:  {len(data):,} bytes ({len(data) / READINGS:.1f} per reading)"
+    )
+    print(f"Compression:   {len(as_json.encode()) / len(data):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
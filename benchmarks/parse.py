@@ -0,0 +1,33 @@
+"""Benchmark the fast and strict parsing modes of every model."""
+
+import json
+import os
+import timeit
+from functools import partial
+
+from cemm import SmartMeter, SolarPanel, WaterMeter
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures")
+ROUNDS = 100_000
+
+
+def main() -> None:
+    """Print the parse throughput of every model, in both modes."""
+    for model, fixture in (
+        (SmartMeter, "smartmeter.json"),
+        (SolarPanel, "solarpanel.json"),
+        (WaterMeter, "watermeter.json"),
+    ):
+        with open(os.path.join(FIXTURES, fixture), encoding="utf-8") as fptr:
+            data = json.load(fptr)
+        for strict in (False, True):
+            seconds = timeit.timeit(
+                partial(model.from_dict, data, strict=strict),
+                number=ROUNDS,
+            )
+            mode = "strict" if strict else "fast"
+            print(f"{model.__name__:<12} {mode:<7} {ROUNDS / seconds:>12,.0f} parses/s")
+
+
+if __name__ == "__main__":
+    main()
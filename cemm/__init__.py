@@ -1,8 +1,17 @@
 """Asynchronous Python client for the CEMM Device."""
 
+from .accounting import EnergyAccounting, EnergyBucket
+from .archive import ArchiveReader, ArchiveWriter
 from .cemm import CEMM
-from .exceptions import CEMMConnectionError, CEMMError
+from .codec import StreamDecoder, StreamEncoder
+from .exceptions import CEMMConnectionError, CEMMError, CEMMParseError
+from .fleet import Fleet, FleetReading
+from .gateway import Gateway
 from .models import Connection, Device, SmartMeter, SolarPanel, WaterMeter
+from .monitor import HealthEvent, HealthMonitor
+from .profiler import SweepProfiler
+from .storage import Sample, SQLiteStorage
+from .timeout import AdaptiveTimeout
 
 __all__ = [
     "WaterMeter",
@@ -13,4 +22,20 @@ __all__ = [
     "CEMM",
     "CEMMError",
     "CEMMConnectionError",
+    "CEMMParseError",
+    "Fleet",
+    "FleetReading",
+    "Sample",
+    "SQLiteStorage",
+    "AdaptiveTimeout",
+    "StreamEncoder",
+    "StreamDecoder",
+    "EnergyAccounting",
+    "EnergyBucket",
+    "HealthMonitor",
+    "HealthEvent",
+    "Gateway",
+    "ArchiveWriter",
+    "ArchiveReader",
+    "SweepProfiler",
 ]
@@ -0,0 +1,162 @@
+"""Incremental energy accounting over SmartMeter readings."""
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+from .models import SmartMeter
+
+CONSUMPTION = ("energy_consumption_low", "energy_consumption_high")
+RETURNED = ("energy_returned_low", "energy_returned_high")
+REGISTERS = (*CONSUMPTION, *RETURNED, "billed_energy_low", "billed_energy_high")
+
+
+@dataclass
+class EnergyBucket:
+    """Object representing the energy of one interval, in kWh.
+
+    `registers` holds the increase of every meter register, `consumption` and
+    `returned` hold the energy per tariff period.
+    """
+
+    start: int
+    interval: int
+    registers: dict[str, float] = field(default_factory=dict)
+    consumption: dict[Any, float] = field(default_factory=dict)
+    returned: dict[Any, float] = field(default_factory=dict)
+
+    @property
+    def end(self) -> int:
+        """Return the end of the interval.
+
+        Returns:
+            The end of the interval, Unix timestamp in ms (exclusive).
+        """
+        return self.start + self.interval * 1000
+
+
+@dataclass
+class EnergyAccounting:
+    """Split the meter registers of a SmartMeter stream into interval buckets.
+
+    Every register is treated as its own series, using the timestamp the
+    device reported for it. The increase between two readings is spread
+    linearly over the buckets the readings span, and attributed to the tariff
+    period of the first reading. A bucket is complete once every register
+    has a reading at or after its end.
+
+    A register that lags more than `max_lag` seconds behind the newest one,
+    for example because its timestamp stopped updating, no longer holds back
+    completion. Energy it reports later for completed intervals is returned
+    in an extra bucket for that interval, holding only that register.
+    """
+
+    intervals: tuple[int, ...] = (900, 3600, 86400)
+    utc_offset: int = 0
+    max_lag: int = 3600
+
+    _last: dict[str, tuple[int, float]] = field(default_factory=dict)
+    _tariff: Any = None
+    # Open buckets per interval, ordered by start.
+    _open: dict[int, deque[EnergyBucket]] = field(default_factory=dict)
+
+    def add(self, reading: SmartMeter) -> list[EnergyBucket]:
+        """Process the next reading of the stream.
+
+        Args:
+            reading: A SmartMeter object, newer than the previous reading.
+
+        Returns:
+            The buckets that are completed by this reading, oldest first.
+        """
+        for name in REGISTERS:
+            value = getattr(reading, name)
+            timestamp = reading.timestamps.get(name, 0)
+            if value is None or not timestamp:
+                continue
+            previous = self._last.get(name)
+            if previous is None or timestamp > previous[0]:
+                self._last[name] = (timestamp, value)
+            if previous is None or timestamp <= previous[0]:
+                continue
+            # A register that goes down has been reset or replaced.
+            if value >= previous[1]:
+                self._spread(name, previous[0], timestamp, value - previous[1])
+
+        self._tariff = reading.energy_tariff_period
+        if not self._last:
+            return []
+        newest = max(timestamp for timestamp, _ in self._last.values())
+        watermark = min(
+            timestamp
+            for timestamp, _ in self._last.values()
+            if timestamp >= newest - self.max_lag * 1000
+        )
+        return self._collect(watermark)
+
+    def add_many(self, readings: Iterable[SmartMeter]) -> list[EnergyBucket]:
+        """Process a batch of historical readings.
+
+        Args:
+            readings: SmartMeter objects, oldest first.
+
+        Returns:
+            The buckets that are completed by these readings, oldest first.
+        """
+        completed: list[EnergyBucket] = []
+        for reading in readings:
+            completed.extend(self.add(reading))
+        return completed
+
+    def flush(self) -> list[EnergyBucket]:
+        """Return all buckets that are still open.
+
+        Returns:
+            The incomplete buckets, oldest first.
+        """
+        return self._collect(None)
+
+    def _spread(self, name: str, start: int, end: int, energy: float) -> None:
+        offset = self.utc_offset * 1000
+        for interval in self.intervals:
+            size = interval * 1000
+            position = start
+            while position < end:
+                bucket_start = (position + offset) // size * size - offset
+                bucket_end = min(end, bucket_start + size)
+                share = energy * (bucket_end - position) / (end - start)
+                self._book(self._bucket(interval, bucket_start), name, share)
+                position = bucket_end
+
+    def _bucket(self, interval: int, start: int) -> EnergyBucket:
+        buckets = self._open.setdefault(interval, deque())
+        # New readings nearly always book into the newest buckets, so search
+        # from the back.
+        position = len(buckets)
+        while position and buckets[position - 1].start >= start:
+            position -= 1
+            if buckets[position].start == start:
+                return buckets[position]
+        bucket = EnergyBucket(start, interval)
+        buckets.insert(position, bucket)
+        return bucket
+
+    def _book(self, bucket: EnergyBucket, name: str, energy: float) -> None:
+        bucket.registers[name] = bucket.registers.get(name, 0.0) + energy
+        if name in CONSUMPTION:
+            tariffs = bucket.consumption
+        elif name in RETURNED:
+            tariffs = bucket.returned
+        else:
+            return
+        tariffs[self._tariff] = tariffs.get(self._tariff, 0.0) + energy
+
+    def _collect(self, watermark: int | None) -> list[EnergyBucket]:
+        completed: list[EnergyBucket] = []
+        for buckets in self._open.values():
+            while buckets and (watermark is None or buckets[0].end <= watermark):
+                completed.append(buckets.popleft())
+        completed.sort(key=lambda bucket: (bucket.start, bucket.interval))
+        return completed
@@ -0,0 +1,361 @@
+"""Append-only archive of readings, read through mmap.
+
+Every channel has its own file: a header with the model and field names,
+followed by fixed-size records of a timestamp (int64, ms) and one column per
+field, in time order. Float fields are stored as float64, with NaN for a
+missing value. Integer fields and the tariff period are stored as int64, with
+the smallest int64 for a missing value; the tariff period is read back as an
+int. Because records have a fixed size and are sorted, the reader can binary
+search on time without loading the file, and hand out NumPy views of a time
+range without copying.
+"""
+from __future__ import annotations
+
+import math
+import mmap
+import os
+import struct
+from dataclasses import dataclass, field, fields
+from typing import TYPE_CHECKING, Any, BinaryIO
+
+from .exceptions import CEMMError
+from .models import MODELS, Reading, value_fields
+
+if TYPE_CHECKING:
+    import numpy as np
+
+MAGIC = b"CEMA"
+VERSION = 2
+
+_PREFIX = struct.Struct("<4sBxH")
+_TIMESTAMP = struct.Struct("<q")
+# Stored in integer columns for a missing value.
+_MISSING = -(2**63)
+
+
+def _columns(model: type[Reading]) -> str:
+    # Annotations are strings, for example "float | None".
+    types = {item.name: str(item.type) for item in fields(model)}
+    return "".join(
+        "d" if types[name].startswith("float") else "q" for name in value_fields(model)
+    )
+
+
+def _header(model: type[Reading]) -> bytes:
+    names = "\n".join([model.__name__, *value_fields(model)]).encode()
+    # Pad the header, so every record is 8-byte aligned for NumPy.
+    size = -(-(_PREFIX.size + len(names)) // 8) * 8
+    return _PREFIX.pack(MAGIC, VERSION, size) + names.ljust(size - _PREFIX.size, b"\0")
+
+
+def _read_header(prefix: bytes, read: Any) -> tuple[type[Reading], list[str], int]:
+    if len(prefix) < _PREFIX.size:
+        raise CEMMError("Not a CEMM archive")
+    magic, version, size = _PREFIX.unpack_from(prefix)
+    if magic != MAGIC or version != VERSION:
+        raise CEMMError("Not a CEMM archive")
+    model, *names = read(size - _PREFIX.size).rstrip(b"\0").decode().split("\n")
+    if model not in MODELS or names != value_fields(MODELS[model]):
+        raise CEMMError(f"Archive model {model!r} does not match this version")
+    return MODELS[model], names, size
+
+
+@dataclass
+class ArchiveWriter:
+    """Append readings of one channel to an archive file."""
+
+    path: str
+    model: type[Reading]
+
+    _file: BinaryIO | None = None
+    _record: struct.Struct = field(init=False)
+    _names: list[str] = field(init=False)
+    _columns: str = field(init=False)
+    _last: int | None = None
+
+    def __post_init__(self) -> None:
+        """Prepare the record layout of the model."""
+        self._names = value_fields(self.model)
+        self._columns = _columns(self.model)
+        self._record = struct.Struct(f"<q{self._columns}")
+
+    def open(self) -> None:
+        """Open the archive, creating it when it does not exist.
+
+        Raises:
+            CEMMError: The file is not an archive of this model.
+        """
+        if self._file is not None:
+            return
+        with open(self.path, "ab+") as handle:
+            handle.seek(0)
+            if handle.seek(0, os.SEEK_END) == 0:
+                handle.write(_header(self.model))
+            else:
+                handle.seek(0)
+                model, _, size = _read_header(handle.read(_PREFIX.size), handle.read)
+                if model is not self.model:
+                    raise CEMMError(
+                        f"Archive holds {model.__name__}, not {self.model.__name__}"
+                    )
+                end = handle.seek(0, os.SEEK_END)
+                # Drop a partial record left by an interrupted write.
+                end -= (end - size) % self._record.size
+                handle.truncate(end)
+                if end > size:
+                    handle.seek(end - self._record.size)
+                    self._last = _TIMESTAMP.unpack(handle.read(_TIMESTAMP.size))[0]
+        self._file = open(self.path, "ab")  # pylint: disable=consider-using-with
+
+    def append(self, reading: Reading, timestamp: int | None = None) -> None:
+        """Append a reading to the archive.
+
+        Args:
+            reading: A reading of the model of this archive.
+            timestamp: Unix timestamp in ms, the newest timestamp of the
+                reading if not set.
+
+        Raises:
+            CEMMError: The archive is not open, the reading is older than the
+                last record or has a value that is not a number, or not an
+                integer for an integer field.
+        """
+        if self._file is None:
+            raise CEMMError("The archive has not been opened")
+        if timestamp is None:
+            timestamp = max(reading.timestamps.values(), default=0)
+        if self._last is not None and timestamp < self._last:
+            raise CEMMError(f"Reading at {timestamp} is older than the archive")
+
+        values: list[float | int] = []
+        for name, column in zip(self._names, self._columns):
+            value = getattr(reading, name)
+            try:
+                values.append(_pack(column, value))
+            except (TypeError, ValueError) as exception:
+                raise CEMMError(f"Cannot archive {name}={value!r}") from exception
+        self._file.write(self._record.pack(timestamp, *values))
+        self._last = timestamp
+
+    def flush(self) -> None:
+        """Write buffered records to the file."""
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        """Close the archive."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> ArchiveWriter:
+        """Open the archive.
+
+        Returns:
+            The ArchiveWriter object.
+        """
+        self.open()
+        return self
+
+    def __exit__(self, *_exc_info: Any) -> None:
+        """Close the archive.
+
+        Args:
+            _exc_info: Exec type.
+        """
+        self.close()
+
+
+@dataclass
+class ArchiveReader:
+    """Random access by time to an archive file, through mmap."""
+
+    path: str
+
+    model: type[Reading] = field(init=False)
+    _names: list[str] = field(init=False)
+    _columns: str = field(init=False)
+    _record: struct.Struct = field(init=False)
+    _offset: int = 0
+    _mmap: mmap.mmap | None = None
+    _count: int = 0
+
+    def open(self) -> None:
+        """Map the archive into memory.
+
+        Raises:
+            CEMMError: The file is not a CEMM archive.
+        """
+        if self._mmap is not None:
+            return
+        with open(self.path, "rb") as handle:
+            self.model, self._names, self._offset = _read_header(
+                handle.read(_PREFIX.size), handle.read
+            )
+            self._columns = _columns(self.model)
+            self._record = struct.Struct(f"<q{self._columns}")
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self._count = (len(self._mmap) - self._offset) // self._record.size
+
+    def __len__(self) -> int:
+        """Return the number of records.
+
+        Returns:
+            The number of records in the archive.
+        """
+        return self._count
+
+    def timestamp(self, index: int) -> int:
+        """Get the timestamp of a record.
+
+        Args:
+            index: The index of the record.
+
+        Returns:
+            The timestamp of the record, Unix timestamp in ms.
+        """
+        buffer = self._buffer()
+        offset = self._offset + index * self._record.size
+        return int(_TIMESTAMP.unpack_from(buffer, offset)[0])
+
+    def read(self, index: int) -> Reading:
+        """Get a record as a model object.
+
+        Args:
+            index: The index of the record.
+
+        Returns:
+            A reading, with the record timestamp for every field.
+
+        Raises:
+            IndexError: There is no record at this index.
+        """
+        if not -self._count <= index < self._count:
+            raise IndexError("Archive index out of range")
+        index %= self._count
+        timestamp, *values = self._record.unpack_from(
+            self._buffer(), self._offset + index * self._record.size
+        )
+        kwargs: dict[str, Any] = {
+            name: _unpack(value) for name, value in zip(self._names, values)
+        }
+        reading = self.model(**kwargs)
+        reading.timestamps = dict.fromkeys(self._names, timestamp)
+        return reading
+
+    def bisect(self, timestamp: int) -> int:
+        """Find the position of a timestamp.
+
+        Args:
+            timestamp: Unix timestamp in ms.
+
+        Returns:
+            The index of the first record newer than the timestamp.
+        """
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamp(middle) <= timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def value_at(self, timestamp: int) -> Reading | None:
+        """Get the reading that was current at a moment.
+
+        Args:
+            timestamp: Unix timestamp in ms.
+
+        Returns:
+            The last reading at or before the timestamp, or None when the
+            archive starts later.
+        """
+        index = self.bisect(timestamp)
+        return self.read(index - 1) if index else None
+
+    def range(self, start: int, end: int) -> np.ndarray[Any, Any]:
+        """Get all records within a time range, without copying them.
+
+        Args:
+            start: Start of the range (inclusive), Unix timestamp in ms.
+            end: End of the range (exclusive), Unix timestamp in ms.
+
+        Returns:
+            A read-only NumPy structured array that shares memory with the
+            archive, with a `timestamp` column and a column per field. Missing
+            values are NaN, or the smallest int64 in integer columns. Release
+            it before closing the reader.
+
+        Raises:
+            CEMMError: NumPy is not installed.
+        """
+        try:
+            import numpy  # pylint: disable=import-outside-toplevel
+        except ImportError as exception:
+            raise CEMMError(
+                "NumPy is required for range queries, install cemm[archive]"
+            ) from exception
+
+        first = self.bisect(start - 1)
+        last = self.bisect(end - 1)
+        dtype = numpy.dtype(
+            [
+                ("timestamp", "<i8"),
+                *(
+                    (name, "<f8" if column == "d" else "<i8")
+                    for name, column in zip(self._names, self._columns)
+                ),
+            ]
+        )
+        return numpy.frombuffer(
+            self._buffer(),
+            dtype=dtype,
+            count=last - first,
+            offset=self._offset + first * self._record.size,
+        )
+
+    def close(self) -> None:
+        """Unmap the archive."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def _buffer(self) -> mmap.mmap:
+        if self._mmap is None:
+            raise CEMMError("The archive has not been opened")
+        return self._mmap
+
+    def __enter__(self) -> ArchiveReader:
+        """Map the archive.
+
+        Returns:
+            The ArchiveReader object.
+        """
+        self.open()
+        return self
+
+    def __exit__(self, *_exc_info: Any) -> None:
+        """Unmap the archive.
+
+        Args:
+            _exc_info: Exec type.
+        """
+        self.close()
+
+
+def _pack(column: str, value: Any) -> float | int:
+    if column == "d":
+        return math.nan if value is None else float(value)
+    if value is None:
+        return _MISSING
+    number = int(value)
+    if number != value and str(number) != value:
+        raise ValueError(f"{value!r} is not an integer")
+    return number
+
+
+def _unpack(value: float | int) -> float | int | None:
+    if isinstance(value, float):
+        return None if math.isnan(value) else value
+    return None if value == _MISSING else value
@@ -3,18 +3,23 @@ from __future__ import annotations
 
 import asyncio
 import socket
+import time
 from collections.abc import Mapping
+from contextlib import AbstractContextManager, nullcontext
 from dataclasses import dataclass
 from importlib import metadata
 from typing import Any
 
 import async_timeout
+from aiohttp import TraceConfig
 from aiohttp.client import ClientError, ClientResponseError, ClientSession
 from aiohttp.hdrs import METH_GET
 from yarl import URL
 
 from .exceptions import CEMMConnectionError, CEMMError
 from .models import Connection, Device, SmartMeter, SolarPanel, WaterMeter
+from .profiler import DECODE, ERROR, MODEL, TIMEOUT, SweepProfiler
+from .timeout import AdaptiveTimeout
 
 
 @dataclass
@@ -24,6 +29,9 @@ class CEMM:
     host: str
     request_timeout: float = 10.0
     session: ClientSession | None = None
+    adaptive_timeout: AdaptiveTimeout | None = None
+    strict: bool = False
+    profiler: SweepProfiler | None = None
 
     _close_session: bool = False
 
@@ -59,27 +67,51 @@ class CEMM:
         }
 
         if self.session is None:
-            self.session = ClientSession()
+            trace_configs: list[TraceConfig] = []
+            if self.profiler is not None:
+                trace_configs.append(self.profiler.trace_config())
+            self.session = ClientSession(trace_configs=trace_configs)
             self._close_session = True
 
+        span = None
+        if self.profiler is not None:
+            span = self.profiler.span(self.host, uri)
+
+        timeout = self.request_timeout
+        if self.adaptive_timeout is not None:
+            timeout = self.adaptive_timeout.timeout(self.host, uri)
+
+        started = time.monotonic()
         try:
-            async with async_timeout.timeout(self.request_timeout):
+            async with async_timeout.timeout(timeout):
                 response = await self.session.request(
                     method,
                     url,
                     params=params,
                     headers=headers,
+                    trace_request_ctx=span,
                 )
                 response.raise_for_status()
         except asyncio.TimeoutError as exception:
+            if self.adaptive_timeout is not None:
+                self.adaptive_timeout.timed_out(self.host, uri)
+            if self.profiler is not None and span is not None:
+                self.profiler.finish(span, time.monotonic() - started, TIMEOUT)
             raise CEMMConnectionError(
                 "Timeout occurred while connecting to CEMM device"
             ) from exception
         except (ClientError, ClientResponseError, socket.gaierror) as exception:
+            if self.profiler is not None and span is not None:
+                self.profiler.finish(span, time.monotonic() - started, ERROR)
             raise CEMMConnectionError(
                 "Error occurred while communicating with the CEMM device"
             ) from exception
 
+        if self.adaptive_timeout is not None:
+            self.adaptive_timeout.observe(self.host, uri, time.monotonic() - started)
+        if self.profiler is not None and span is not None:
+            self.profiler.finish(span, time.monotonic() - started)
+
         content_type = response.headers.get("Content-Type", "")
         if "application/json" not in content_type:
             text = await response.text()
@@ -88,7 +120,8 @@ class CEMM:
                 {"Content-Type": content_type, "response": text},
             )
 
-        return await response.json()
+        with self._stage(uri if span is None else span.alias, DECODE):
+            return await response.json()
 
     async def all_connections(self) -> list[Connection]:
         """Get a list of all used aliases.
@@ -99,8 +132,9 @@ class CEMM:
         results: list[Connection] = []
 
         data = await self.request("v1/io")
-        for item in data["data"]:
-            results.append(Connection.from_dict(item))
+        with self._stage("v1/io", MODEL):
+            for item in data["data"]:
+                results.append(Connection.from_dict(item))
         return results
 
     async def device(self) -> Device:
@@ -110,8 +144,8 @@ class CEMM:
             A Device data object from the CEMM device API.
         """
         data = await self.request("v1")
-        data = data["data"]
-        return Device.from_dict(data)
+        with self._stage("v1", MODEL):
+            return Device.from_dict(data["data"])
 
     async def smartmeter(self, alias: str) -> SmartMeter:
         """Get the latest values from the CEMM device.
@@ -123,7 +157,8 @@ class CEMM:
             A SmartMeter data object from the CEMM device API.
         """
         data = await self.request(f"v1/{alias}/realtime")
-        return SmartMeter.from_dict(data)
+        with self._stage(alias, MODEL):
+            return SmartMeter.from_dict(data, strict=self.strict)
 
     async def watermeter(self, alias: str) -> WaterMeter:
         """Get the latest values from the CEMM device.
@@ -136,7 +171,8 @@ class CEMM:
             A WaterMeter data object from the CEMM device API.
         """
         data = await self.request(f"v1/{alias}/realtime")
-        return WaterMeter.from_dict(data)
+        with self._stage(alias, MODEL):
+            return WaterMeter.from_dict(data, strict=self.strict)
 
     async def solarpanel(self, alias: str) -> SolarPanel:
         """Get the latest values from the CEMM device.
@@ -149,7 +185,13 @@ class CEMM:
             A SolarPanel data object from the CEMM device API.
         """
         data = await self.request(f"v1/{alias}/realtime")
-        return SolarPanel.from_dict(data)
+        with self._stage(alias, MODEL):
+            return SolarPanel.from_dict(data, strict=self.strict)
+
+    def _stage(self, alias: str, stage: str) -> AbstractContextManager[None]:
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.stage(self.host, alias, stage)
 
     async def close(self) -> None:
         """Close open client session."""
@@ -0,0 +1,332 @@
+"""Compact binary codec for streams of CEMM readings.
+
+A stream holds the readings of a single channel. It starts with a header that
+names the model and its fields, followed by one length-prefixed frame per
+reading. Within a frame, every field has a 4-bit tag, a delta-of-delta encoded
+timestamp (left out, and flagged in the tag, when the reading has none for
+the field) and a value that is encoded against the previous value of the same
+field: floats are XOR-ed with the previous float, integers are stored as a
+delta and unchanged values take no space at all.
+"""
+from __future__ import annotations
+
+import struct
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from typing import Any, cast
+
+from .exceptions import CEMMError
+from .models import MODELS, Reading, value_fields
+
+MAGIC = b"CEMS"
+VERSION = 2
+
+_NONE = 0
+_REPEAT = 1
+_FLOAT = 2
+_INT = 3
+_STR = 4
+# Set in the tag of a field the reading has no timestamp for.
+_NO_TIMESTAMP = 8
+
+_DOUBLE = struct.Struct("<d")
+_UINT64 = struct.Struct("<Q")
+
+
+def _write_varint(buffer: bytearray, value: int) -> None:
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data: bytes | bytearray, offset: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        if offset >= len(data):
+            raise IndexError("Truncated varint")
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+
+def _zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def _write_string(buffer: bytearray, value: str) -> None:
+    encoded = value.encode()
+    _write_varint(buffer, len(encoded))
+    buffer += encoded
+
+
+def _read_string(data: bytes | bytearray, offset: int) -> tuple[str, int]:
+    length, offset = _read_varint(data, offset)
+    end = offset + length
+    return bytes(data[offset:end]).decode(), end
+
+
+def _float_bits(value: float) -> int:
+    return int(_UINT64.unpack(_DOUBLE.pack(value))[0])
+
+
+@dataclass
+class _FieldState:
+    """Previous timestamp and values of a field, shared by encoder and decoder."""
+
+    timestamp: int = 0
+    delta: int = 0
+    value: Any = None
+    bits: int = 0
+    integer: int = 0
+
+
+@dataclass
+class StreamEncoder:
+    """Encode the readings of one channel into a compact byte stream.
+
+    The first call to `encode` also returns the stream header.
+    """
+
+    model: type[Reading]
+
+    _names: list[str] = field(init=False)
+    _states: list[_FieldState] = field(init=False)
+    _started: bool = False
+
+    def __post_init__(self) -> None:
+        """Prepare the state of every field of the model."""
+        self._names = value_fields(self.model)
+        self._states = [_FieldState() for _ in self._names]
+
+    def header(self) -> bytes:
+        """Get the header that describes the stream.
+
+        Returns:
+            The header as bytes.
+        """
+        buffer = bytearray(MAGIC)
+        buffer.append(VERSION)
+        _write_string(buffer, self.model.__name__)
+        _write_varint(buffer, len(self._names))
+        for name in self._names:
+            _write_string(buffer, name)
+        return bytes(buffer)
+
+    def encode(self, reading: Reading) -> bytes:
+        """Encode the next reading of the stream.
+
+        Args:
+            reading: A reading of the model of this stream.
+
+        Returns:
+            The encoded frame, preceded by the header for the first reading.
+
+        Raises:
+            CEMMError: The reading is of another model, or has a value that
+                cannot be encoded.
+        """
+        if not isinstance(reading, self.model):
+            raise CEMMError(
+                f"Cannot encode {type(reading).__name__} in a "
+                f"{self.model.__name__} stream"
+            )
+
+        tags = bytearray((len(self._names) + 1) // 2)
+        body = bytearray()
+        for index, name in enumerate(self._names):
+            state = self._states[index]
+            timestamp = reading.timestamps.get(name)
+            if timestamp is None:
+                tag = _NO_TIMESTAMP
+            else:
+                tag = 0
+                delta = timestamp - state.timestamp
+                _write_varint(body, _zigzag(delta - state.delta))
+                state.timestamp, state.delta = timestamp, delta
+
+            value = getattr(reading, name)
+            tag |= self._encode_value(body, state, value)
+            tags[index // 2] |= tag << (4 * (index % 2))
+
+        frame = bytearray()
+        if not self._started:
+            frame += self.header()
+            self._started = True
+        _write_varint(frame, len(tags) + len(body))
+        frame += tags
+        frame += body
+        return bytes(frame)
+
+    @staticmethod
+    def _encode_value(body: bytearray, state: _FieldState, value: Any) -> int:
+        if value is None:
+            state.value = None
+            return _NONE
+        if type(value) is type(state.value) and value == state.value:
+            return _REPEAT
+        state.value = value
+        if isinstance(value, float):
+            bits = _float_bits(value)
+            xor = bits ^ state.bits
+            state.bits = bits
+            leading = (64 - xor.bit_length()) // 8
+            trailing = 0
+            while trailing < 8 - leading and not xor >> (8 * trailing) & 0xFF:
+                trailing += 1
+            body.append(leading << 4 | trailing)
+            body += (xor >> (8 * trailing)).to_bytes(8 - leading - trailing, "big")
+            return _FLOAT
+        if isinstance(value, int):
+            _write_varint(body, _zigzag(value - state.integer))
+            state.integer = value
+            return _INT
+        if isinstance(value, str):
+            _write_string(body, value)
+            return _STR
+        raise CEMMError(f"Cannot encode value of type {type(value).__name__}")
+
+
+@dataclass
+class StreamDecoder:
+    """Decode a byte stream created by a StreamEncoder.
+
+    Data can be fed in chunks of any size, incomplete frames are kept until
+    the rest of the frame arrives.
+    """
+
+    model: type[Reading] | None = field(default=None, init=False)
+
+    _names: list[str] = field(default_factory=list)
+    _states: list[_FieldState] = field(default_factory=list)
+    _buffer: bytearray = field(default_factory=bytearray)
+
+    def feed(self, data: bytes) -> list[Reading]:
+        """Decode all complete readings in the stream so far.
+
+        Args:
+            data: The next chunk of the stream.
+
+        Returns:
+            A list with the decoded readings.
+
+        Raises:
+            CEMMError: The stream is not a valid CEMM reading stream.
+        """
+        self._buffer += data
+        offset = 0
+        readings: list[Reading] = []
+        try:
+            if self.model is None:
+                offset = self._read_header()
+            while True:
+                length, start = _read_varint(self._buffer, offset)
+                if start + length > len(self._buffer):
+                    break
+                readings.append(self._read_frame(start))
+                offset = start + length
+        except IndexError:
+            pass
+        del self._buffer[:offset]
+        return readings
+
+    def _read_header(self) -> int:
+        data = self._buffer
+        if len(data) < len(MAGIC) + 1:
+            raise IndexError("Truncated header")
+        if data[: len(MAGIC)] != MAGIC or data[len(MAGIC)] != VERSION:
+            raise CEMMError("Not a CEMM reading stream")
+        name, offset = _read_string(data, len(MAGIC) + 1)
+        count, offset = _read_varint(data, offset)
+        names = []
+        for _ in range(count):
+            item, offset = _read_string(data, offset)
+            names.append(item)
+        if offset > len(data):
+            raise IndexError("Truncated header")
+        if name not in MODELS:
+            raise CEMMError(f"Unknown model {name!r} in stream")
+
+        self.model = MODELS[name]
+        self._names = names
+        self._states = [_FieldState() for _ in names]
+        return offset
+
+    def _read_frame(self, offset: int) -> Reading:
+        data = self._buffer
+        end = offset + (len(self._names) + 1) // 2
+        tags, offset = data[offset:end], end
+        values: dict[str, Any] = {}
+        timestamps: dict[str, int] = {}
+        for index, name in enumerate(self._names):
+            state = self._states[index]
+            tag = tags[index // 2] >> (4 * (index % 2)) & 0x0F
+            if not tag & _NO_TIMESTAMP:
+                dod, offset = _read_varint(data, offset)
+                state.delta += _unzigzag(dod)
+                state.timestamp += state.delta
+                timestamps[name] = state.timestamp
+
+            offset = self._decode_value(data, offset, state, tag & ~_NO_TIMESTAMP)
+            values[name] = state.value
+
+        reading = cast("type[Reading]", self.model)(**values)
+        reading.timestamps = timestamps
+        return reading
+
+    @staticmethod
+    def _decode_value(
+        data: bytearray, offset: int, state: _FieldState, tag: int
+    ) -> int:
+        if tag == _NONE:
+            state.value = None
+        elif tag == _FLOAT:
+            control = data[offset]
+            leading, trailing = control >> 4, control & 0x0F
+            start, offset = offset + 1, offset + 9 - leading - trailing
+            state.bits ^= int.from_bytes(data[start:offset], "big") << (8 * trailing)
+            state.value = _DOUBLE.unpack(_UINT64.pack(state.bits))[0]
+        elif tag == _INT:
+            delta, offset = _read_varint(data, offset)
+            state.integer += _unzigzag(delta)
+            state.value = state.integer
+        elif tag == _STR:
+            state.value, offset = _read_string(data, offset)
+        return offset
+
+
+def encode_stream(readings: Sequence[Reading]) -> bytes:
+    """Encode the readings of one channel at once.
+
+    Args:
+        readings: The readings, all of the same model.
+
+    Returns:
+        The complete stream as bytes.
+
+    Raises:
+        CEMMError: There are no readings to encode.
+    """
+    if not readings:
+        raise CEMMError("Cannot encode an empty stream")
+    encoder = StreamEncoder(type(readings[0]))
+    return b"".join(encoder.encode(reading) for reading in readings)
+
+
+def decode_stream(data: bytes) -> list[Reading]:
+    """Decode a complete stream.
+
+    Args:
+        data: The stream, as created by a StreamEncoder.
+
+    Returns:
+        A list with the decoded readings.
+    """
+    return StreamDecoder().feed(data)
@@ -7,3 +7,19 @@ class CEMMError(Exception):
 
 class CEMMConnectionError(CEMMError):
     """CEMM connection exception."""
+
+
+class CEMMParseError(CEMMError):
+    """CEMM response parse exception."""
+
+    def __init__(self, message: str, model: str, errors: list[str]) -> None:
+        """Initialize the exception.
+
+        Args:
+            message: Description of the error.
+            model: The model that could not be parsed.
+            errors: Every problem found in the response.
+        """
+        super().__init__(message)
+        self.model = model
+        self.errors = errors
@@ -0,0 +1,341 @@
+"""Poll a large fleet of CEMM devices from multiple worker processes."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from multiprocessing.process import BaseProcess
+from multiprocessing.queues import Queue
+from typing import Any
+
+from aiohttp.client import ClientSession
+
+from .cemm import CEMM
+from .exceptions import CEMMError
+from .models import CHANNEL_TYPES, Reading, value_fields
+
+# The index of a channel kind is its compact code on the wire.
+_KINDS = list(CHANNEL_TYPES)
+_FIELDS = {kind: value_fields(model) for kind, model in CHANNEL_TYPES.items()}
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class FleetReading:
+    """Object representing the result of polling a single channel."""
+
+    host: str
+    alias: str
+    reading: Reading | None
+    error: str | None = None
+
+
+def shard_for(host: str, shards: int) -> int:
+    """Return the worker index a host is assigned to.
+
+    Uses rendezvous hashing, so changing the number of shards only moves the
+    hosts that have to move.
+
+    Args:
+        host: The host of the CEMM device.
+        shards: The number of workers.
+
+    Returns:
+        The index of the worker for this host.
+    """
+    return max(
+        range(shards),
+        key=lambda index: hashlib.sha1(  # noqa: S324 # nosec
+            f"{index}:{host}".encode()
+        ).digest(),
+    )
+
+
+def _encode(host: str, alias: str, kind: str, reading: Reading) -> tuple[Any, ...]:
+    timestamps = reading.timestamps
+    names = _FIELDS[kind]
+    return (
+        _KINDS.index(kind),
+        host,
+        alias,
+        tuple(getattr(reading, name) for name in names),
+        # None for fields the device reported no timestamp for.
+        tuple(timestamps.get(name) for name in names),
+    )
+
+
+def _decode(item: tuple[Any, ...]) -> FleetReading:
+    code, host, alias, values, timestamps = item
+    if code < 0:
+        return FleetReading(host, alias, None, values)
+    kind = _KINDS[code]
+    names = _FIELDS[kind]
+    reading = CHANNEL_TYPES[kind](**dict(zip(names, values)))
+    reading.timestamps = {
+        name: timestamp
+        for name, timestamp in zip(names, timestamps)
+        if timestamp is not None
+    }
+    return FleetReading(host, alias, reading)
+
+
+async def _poll(client: CEMM, alias: str, kind: str) -> tuple[Any, ...]:
+    try:
+        reading = await getattr(client, kind)(alias)
+    except Exception as exception:  # pylint: disable=broad-except
+        # Any failure, including a malformed body, only fails this channel.
+        message = f"{type(exception).__name__}: {exception}"
+        return (-1, client.host, alias, message, ())
+    return _encode(client.host, alias, kind, reading)
+
+
+async def _sweep(
+    clients: dict[str, CEMM], targets: dict[str, dict[str, str]]
+) -> list[tuple[Any, ...]]:
+    return list(
+        await asyncio.gather(
+            *(
+                _poll(clients[host], alias, kind)
+                for host, channels in targets.items()
+                if host in clients
+                for alias, kind in channels.items()
+            )
+        )
+    )
+
+
+async def _run_worker(
+    control: Queue[Any],
+    results: Queue[Any],
+    interval: float,
+    request_timeout: float,
+    batch_size: int,
+) -> None:
+    loop = asyncio.get_running_loop()
+    targets: dict[str, dict[str, str]] = {}
+    clients: dict[str, CEMM] = {}
+    tasks: set[asyncio.Task[None]] = set()
+    stopped = asyncio.Event()
+
+    async def sweep(hosts: dict[str, dict[str, str]]) -> None:
+        try:
+            items = await _sweep(clients, hosts)
+            for index in range(0, len(items), batch_size):
+                end = index + batch_size
+                results.put(items[index:end])
+        except Exception:  # pylint: disable=broad-except
+            # A failed sweep must not stop the worker and its other hosts.
+            _LOGGER.exception("Sweep of %d hosts failed", len(hosts))
+
+    async with ClientSession() as session:
+
+        async def listen() -> None:
+            while True:
+                message = await loop.run_in_executor(None, control.get)
+                if message[0] == "add":
+                    host = message[1]
+                    targets[host] = message[2]
+                    clients[host] = CEMM(
+                        host, request_timeout=request_timeout, session=session
+                    )
+                    # Poll new hosts right away instead of waiting for a sweep.
+                    task = loop.create_task(sweep({host: targets[host]}))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif message[0] == "remove":
+                    targets.pop(message[1], None)
+                    clients.pop(message[1], None)
+                else:
+                    stopped.set()
+                    return
+
+        listener = loop.create_task(listen())
+        started = loop.time()
+        while True:
+            try:
+                await asyncio.wait_for(
+                    stopped.wait(), max(0.0, started + interval - loop.time())
+                )
+            except asyncio.TimeoutError:
+                started = loop.time()
+                await sweep(dict(targets))
+            else:
+                break
+        await listener
+        await asyncio.gather(*tasks)
+
+
+def _worker(
+    control: Queue[Any],
+    results: Queue[Any],
+    interval: float,
+    request_timeout: float,
+    batch_size: int,
+) -> None:
+    asyncio.run(_run_worker(control, results, interval, request_timeout, batch_size))
+
+
+@dataclass
+class Fleet:
+    """Poll many CEMM devices, spread over a pool of worker processes.
+
+    Every worker runs its own event loop with one pooled session for the
+    hosts assigned to it, and sends the readings of each sweep back to the
+    parent process in batches.
+    """
+
+    workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    interval: float = 10.0
+    request_timeout: float = 10.0
+    batch_size: int = 100
+
+    _hosts: dict[str, dict[str, str]] = field(default_factory=dict)
+    _assignment: dict[str, int] = field(default_factory=dict)
+    _processes: list[BaseProcess] = field(default_factory=list)
+    _control: list[Queue[Any]] = field(default_factory=list)
+    _results: Queue[Any] | None = None
+
+    def add_host(self, host: str, channels: dict[str, str]) -> None:
+        """Add a device, or replace the channels of a known device.
+
+        Args:
+            host: The host of the CEMM device.
+            channels: The aliases to poll, with their kind as value
+                (smartmeter, watermeter or solarpanel).
+
+        Raises:
+            CEMMError: One of the channels has an unknown kind.
+        """
+        for alias, kind in channels.items():
+            if kind not in CHANNEL_TYPES:
+                raise CEMMError(f"Unknown channel kind {kind!r} for alias {alias!r}")
+        self._hosts[host] = dict(channels)
+        self._assignment[host] = shard_for(host, self.workers)
+        self._send(self._assignment[host], ("add", host, self._hosts[host]))
+
+    def remove_host(self, host: str) -> None:
+        """Stop polling a device.
+
+        Args:
+            host: The host of the CEMM device.
+        """
+        self._hosts.pop(host, None)
+        shard = self._assignment.pop(host, None)
+        if shard is not None:
+            self._send(shard, ("remove", host))
+
+    def resize(self, workers: int) -> None:
+        """Change the number of workers and move the hosts that need to move.
+
+        Args:
+            workers: The new number of worker processes.
+        """
+        running = bool(self._processes)
+        previous = self.workers
+        self.workers = workers
+        if running:
+            for _ in range(previous, workers):
+                self._spawn()
+
+        for host, channels in self._hosts.items():
+            shard = shard_for(host, workers)
+            if shard != self._assignment[host]:
+                self._send(self._assignment[host], ("remove", host))
+                self._send(shard, ("add", host, channels))
+                self._assignment[host] = shard
+
+        if running:
+            for _ in range(workers, previous):
+                self._control.pop().put(("stop",))
+                self._join(self._processes.pop())
+
+    def start(self) -> None:
+        """Start the worker processes."""
+        if self._processes:
+            return
+        self._results = multiprocessing.get_context("spawn").Queue()
+        for _ in range(self.workers):
+            self._spawn()
+        for host, channels in self._hosts.items():
+            self._send(self._assignment[host], ("add", host, channels))
+
+    async def readings(self) -> AsyncIterator[FleetReading]:
+        """Get the readings of all workers, until the fleet is stopped.
+
+        Yields:
+            A FleetReading object for every polled channel.
+
+        Raises:
+            CEMMError: The fleet has not been started.
+        """
+        if self._results is None:
+            raise CEMMError("The fleet has not been started")
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await loop.run_in_executor(None, self._results.get)
+            if batch is None:
+                return
+            for item in batch:
+                yield _decode(item)
+
+    def stop(self) -> None:
+        """Stop all worker processes."""
+        for control in self._control:
+            control.put(("stop",))
+        for process in self._processes:
+            self._join(process)
+        if self._results is not None:
+            self._results.put(None)
+        self._control.clear()
+        self._processes.clear()
+
+    def _spawn(self) -> None:
+        context = multiprocessing.get_context("spawn")
+        control = context.Queue()
+        process = context.Process(
+            target=_worker,
+            args=(
+                control,
+                self._results,
+                self.interval,
+                self.request_timeout,
+                self.batch_size,
+            ),
+            daemon=True,
+        )
+        process.start()
+        self._control.append(control)
+        self._processes.append(process)
+
+    def _join(self, process: BaseProcess) -> None:
+        # A worker finishes its running sweep before it stops.
+        process.join(self.request_timeout + 1)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+
+    def _send(self, shard: int, message: tuple[Any, ...]) -> None:
+        if self._processes:
+            self._control[shard].put(message)
+
+    def __enter__(self) -> Fleet:
+        """Start the fleet.
+
+        Returns:
+            The Fleet object.
+        """
+        self.start()
+        return self
+
+    def __exit__(self, *_exc_info: Any) -> None:
+        """Stop the fleet.
+
+        Args:
+            _exc_info: Exec type.
+        """
+        self.stop()
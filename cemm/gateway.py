@@ -0,0 +1,212 @@
+"""HTTP gateway that serves the latest values of many CEMM devices."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+from aiohttp import web
+from aiohttp.client import ClientSession
+
+from .cemm import CEMM
+from .exceptions import CEMMError
+from .models import CHANNEL_TYPES
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class _Entry:
+    """A cached JSON response."""
+
+    body: bytes
+    etag: str
+
+
+@dataclass
+class Gateway:
+    """Poll every CEMM device once per interval and serve the values over HTTP.
+
+    Responses are served from memory with an ETag, so clients polling with
+    If-None-Match get a 304 until the device reports new values. When a
+    device cannot be reached, the last known values are kept.
+
+    Endpoints:
+        /devices: All devices, with the time and error of the last poll.
+        /devices/{host}: The Device object of a device.
+        /devices/{host}/connections: The Connection objects of a device.
+        /devices/{host}/{alias}: The latest reading of a channel.
+    """
+
+    devices: dict[str, dict[str, str]]
+    interval: float = 10.0
+    request_timeout: float = 10.0
+    session: ClientSession | None = None
+
+    _cache: dict[str, _Entry] = field(default_factory=dict)
+    _status: dict[str, dict[str, Any]] = field(default_factory=dict)
+    _runner: web.AppRunner | None = None
+    _poller: asyncio.Task[None] | None = None
+    _close_session: bool = False
+
+    def __post_init__(self) -> None:
+        """Validate the configured channels.
+
+        Raises:
+            CEMMError: One of the channels has an unknown kind.
+        """
+        for host, channels in self.devices.items():
+            for alias, kind in channels.items():
+                if kind not in CHANNEL_TYPES:
+                    raise CEMMError(f"Unknown channel kind {kind!r} for {host}/{alias}")
+
+    async def refresh(self) -> None:
+        """Poll all devices once and update the cache.
+
+        A device that fails in any way only marks its own paths as failed.
+        """
+        if self.session is None:
+            self.session = ClientSession()
+            self._close_session = True
+        results = await asyncio.gather(
+            *(self._refresh_device(host) for host in self.devices),
+            return_exceptions=True,
+        )
+        for host, result in zip(self.devices, results):
+            if isinstance(result, Exception):
+                _LOGGER.error("Refreshing %s failed: %r", host, result)
+                status = self._status.setdefault(host, {"updated": None})
+                status["errors"] = [f"{type(result).__name__}: {result}"]
+            elif isinstance(result, BaseException):
+                raise result
+        self._store(
+            "/devices",
+            [{"host": host, **self._status[host]} for host in self.devices],
+        )
+
+    def application(self) -> web.Application:
+        """Create the web application that serves the cache.
+
+        Returns:
+            An aiohttp web Application.
+        """
+        app = web.Application()
+        app.router.add_get("/devices", self._handle)
+        app.router.add_get("/devices/{host}", self._handle)
+        app.router.add_get("/devices/{host}/{alias}", self._handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> None:
+        """Poll the devices once, then start the server and the poll schedule.
+
+        Args:
+            host: The address to listen on.
+            port: The port to listen on.
+        """
+        await self.refresh()
+        self._runner = web.AppRunner(self.application())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self._poller = asyncio.create_task(self._poll())
+
+    async def close(self) -> None:
+        """Stop the server, the poll schedule and close the session."""
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self.session and self._close_session:
+            await self.session.close()
+
+    async def _poll(self) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            # Skip missed sweeps when a refresh takes longer than the interval.
+            deadline = max(deadline + self.interval, loop.time())
+            await asyncio.sleep(deadline - loop.time())
+            try:
+                await self.refresh()
+            except Exception:  # pylint: disable=broad-except
+                # Keep serving the last values and try again next interval.
+                _LOGGER.exception("Refreshing the CEMM devices failed")
+
+    async def _refresh_device(self, host: str) -> None:
+        client = CEMM(host, request_timeout=self.request_timeout, session=self.session)
+        channels = self.devices[host]
+        results = await asyncio.gather(
+            client.device(),
+            client.all_connections(),
+            *(getattr(client, kind)(alias) for alias, kind in channels.items()),
+            return_exceptions=True,
+        )
+        paths = [
+            f"/devices/{host}",
+            f"/devices/{host}/connections",
+            *(f"/devices/{host}/{alias}" for alias in channels),
+        ]
+
+        errors = []
+        for path, result in zip(paths, results):
+            if isinstance(result, Exception):
+                # Includes malformed bodies, which fail while decoding JSON.
+                errors.append(f"{path}: {type(result).__name__}: {result}")
+            elif isinstance(result, BaseException):
+                raise result
+            elif isinstance(result, list):
+                self._store(path, [asdict(item) for item in result])
+            else:
+                self._store(path, asdict(result))
+
+        status = self._status.setdefault(host, {"updated": None})
+        status["errors"] = errors
+        if len(errors) < len(paths):
+            status["updated"] = time.time()
+
+    def _store(self, path: str, data: Any) -> None:
+        body = json.dumps(data, sort_keys=True).encode()
+        entry = self._cache.get(path)
+        if entry is None or entry.body != body:
+            digest = hashlib.sha256(body).hexdigest()[:32]
+            self._cache[path] = _Entry(body, f'"{digest}"')
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        entry = self._cache.get(request.path)
+        if entry is None:
+            raise web.HTTPNotFound()
+
+        headers = {
+            "ETag": entry.etag,
+            "Cache-Control": f"max-age={int(self.interval)}",
+        }
+        if_none_match = [
+            tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")
+        ]
+        if entry.etag in if_none_match or "*" in if_none_match:
+            return web.Response(status=304, headers=headers)
+        return web.Response(
+            body=entry.body, content_type="application/json", headers=headers
+        )
+
+    async def __aenter__(self) -> Gateway:
+        """Async enter.
+
+        Returns:
+            The Gateway object.
+        """
+        return self
+
+    async def __aexit__(self, *_exc_info: Any) -> None:
+        """Async exit.
+
+        Args:
+            _exc_info: Exec type.
+        """
+        await self.close()
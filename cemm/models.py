@@ -1,8 +1,10 @@
 """Models for CEMM device."""
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any
+from dataclasses import dataclass, field, fields
+from typing import Any, Union
+
+from .parsing import NUMBER, FieldSpec, Parser
 
 
 @dataclass
@@ -58,6 +60,55 @@ class Device:
         )
 
 
+_SOLARPANEL = Parser(
+    "SolarPanel",
+    (
+        FieldSpec("power_flow", (("data", "electric_power"),)),
+        FieldSpec("device_consumption_total", (("totals", "t3"), ("totals", "t4"))),
+        FieldSpec("device_consumption_low", (("totals", "t3"),)),
+        FieldSpec("device_consumption_high", (("totals", "t4"),)),
+        FieldSpec("gross_production_total", (("totals", "t1"), ("totals", "t2"))),
+        FieldSpec("gross_production_low", (("totals", "t1"),)),
+        FieldSpec("gross_production_high", (("totals", "t2"),)),
+        FieldSpec(
+            "net_production_total",
+            (("totals", "electric_energy"), ("totals", "electric_energy_high")),
+        ),
+        FieldSpec("net_production_low", (("totals", "electric_energy"),)),
+        FieldSpec("net_production_high", (("totals", "electric_energy_high"),)),
+    ),
+)
+
+_WATERMETER = Parser(
+    "WaterMeter",
+    (
+        FieldSpec("flow", (("data", "flow"),)),
+        FieldSpec("volume", (("totals", "volume"),)),
+    ),
+)
+
+# Not every firmware reports the power, gas and tariff period.
+_SMARTMETER = Parser(
+    "SmartMeter",
+    (
+        FieldSpec("power_flow", (("data", "electric_power"),), optional=True),
+        FieldSpec("gas_consumption", (("data", "gas"),), optional=True),
+        FieldSpec(
+            "energy_tariff_period",
+            (("data", "rate"),),
+            optional=True,
+            types=(*NUMBER, str),
+        ),
+        FieldSpec("energy_consumption_low", (("data", "t1"),)),
+        FieldSpec("energy_consumption_high", (("data", "t2"),)),
+        FieldSpec("energy_returned_low", (("data", "t3"),)),
+        FieldSpec("energy_returned_high", (("data", "t4"),)),
+        FieldSpec("billed_energy_low", (("totals", "electric_energy"),)),
+        FieldSpec("billed_energy_high", (("totals", "electric_energy_high"),)),
+    ),
+)
+
+
 @dataclass
 class SolarPanel:
     """Object representing an SolarPanel response from CEMM device.
@@ -84,40 +135,22 @@ class SolarPanel:
     net_production_low: float
     net_production_high: float
 
+    # Unix timestamp (ms) of every value, as reported by the device.
+    timestamps: dict[str, int] = field(default_factory=dict, repr=False, compare=False)
+
     @staticmethod
-    def from_dict(data: dict[str, Any]) -> SolarPanel:
+    def from_dict(data: dict[str, Any], *, strict: bool = False) -> SolarPanel:
         """Return SolarPanel object from the CEMM device response.
 
         Args:
             data: The JSON data from the CEMM device.
+            strict: Validate the response before parsing it.
 
         Returns:
             An SolarPanel object.
         """
-
-        def sum_values(value1: float, value2: float) -> float:
-            total = round(float(value1 + value2), 2)
-            return total
-
-        return SolarPanel(
-            power_flow=data["data"]["electric_power"][1],
-            device_consumption_total=sum_values(
-                data["totals"]["t3"][1], data["totals"]["t4"][1]
-            ),
-            device_consumption_low=data["totals"]["t3"][1],
-            device_consumption_high=data["totals"]["t4"][1],
-            gross_production_total=sum_values(
-                data["totals"]["t1"][1], data["totals"]["t2"][1]
-            ),
-            gross_production_low=data["totals"]["t1"][1],
-            gross_production_high=data["totals"]["t2"][1],
-            net_production_total=sum_values(
-                data["totals"]["electric_energy"][1],
-                data["totals"]["electric_energy_high"][1],
-            ),
-            net_production_low=data["totals"]["electric_energy"][1],
-            net_production_high=data["totals"]["electric_energy_high"][1],
-        )
+        values, timestamps = _SOLARPANEL.parse(data, strict=strict)
+        return SolarPanel(**values, timestamps=timestamps)
 
 
 @dataclass
@@ -127,19 +160,22 @@ class WaterMeter:
     flow: float
     volume: float
 
+    # Unix timestamp (ms) of every value, as reported by the device.
+    timestamps: dict[str, int] = field(default_factory=dict, repr=False, compare=False)
+
     @staticmethod
-    def from_dict(data: dict[str, Any]) -> WaterMeter:
+    def from_dict(data: dict[str, Any], *, strict: bool = False) -> WaterMeter:
         """Return Water object from the CEMM response.
 
         Args:
             data: The JSON data from the CEMM device.
+            strict: Validate the response before parsing it.
 
         Returns:
             An Water object.
         """
-        return WaterMeter(
-            flow=data["data"]["flow"][1], volume=data["totals"]["volume"][1]
-        )
+        values, timestamps = _WATERMETER.parse(data, strict=strict)
+        return WaterMeter(**values, timestamps=timestamps)
 
 
 @dataclass
@@ -158,24 +194,46 @@ class SmartMeter:
     billed_energy_low: float
     billed_energy_high: float
 
+    # Unix timestamp (ms) of every value, as reported by the device.
+    timestamps: dict[str, int] = field(default_factory=dict, repr=False, compare=False)
+
     @staticmethod
-    def from_dict(data: dict[str, Any]) -> SmartMeter:
+    def from_dict(data: dict[str, Any], *, strict: bool = False) -> SmartMeter:
         """Return SmartMeter object from the CEMM response.
 
         Args:
             data: The JSON data from the CEMM device.
+            strict: Validate the response before parsing it.
 
         Returns:
             An SmartMeter object.
         """
-        return SmartMeter(
-            power_flow=data["data"]["electric_power"][1],
-            gas_consumption=data["data"]["gas"][1],
-            energy_tariff_period=data["data"]["rate"][1],
-            energy_consumption_low=data["data"]["t1"][1],
-            energy_consumption_high=data["data"]["t2"][1],
-            energy_returned_low=data["data"]["t3"][1],
-            energy_returned_high=data["data"]["t4"][1],
-            billed_energy_low=data["totals"]["electric_energy"][1],
-            billed_energy_high=data["totals"]["electric_energy_high"][1],
-        )
+        values, timestamps = _SMARTMETER.parse(data, strict=strict)
+        return SmartMeter(**values, timestamps=timestamps)
+
+
+Reading = Union[SmartMeter, SolarPanel, WaterMeter]
+
+# The reading models by class name, as stored in streams and archives.
+MODELS: dict[str, type[Reading]] = {
+    model.__name__: model for model in (SmartMeter, SolarPanel, WaterMeter)
+}
+
+# Channel kinds, by the name of the CEMM method that reads them.
+CHANNEL_TYPES: dict[str, type[Reading]] = {
+    "smartmeter": SmartMeter,
+    "watermeter": WaterMeter,
+    "solarpanel": SolarPanel,
+}
+
+
+def value_fields(model: type[Reading]) -> list[str]:
+    """Return the names of the values of a reading model.
+
+    Args:
+        model: The SmartMeter, SolarPanel or WaterMeter class.
+
+    Returns:
+        The field names, without `timestamps`.
+    """
+    return [item.name for item in fields(model) if item.name != "timestamps"]
@@ -0,0 +1,254 @@
+"""Health and staleness monitoring for the channels of CEMM devices."""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from .models import Reading
+
+STALE = "stale"
+FLAPPING = "flapping"
+RECOVERED = "recovered"
+
+
+@dataclass
+class HealthEvent:
+    """Object representing a change in the health of a channel."""
+
+    host: str
+    alias: str
+    kind: str
+    reason: str
+    time: float
+
+
+@dataclass
+class _Channel:
+    """State of a single (host, alias) channel."""
+
+    host: str
+    alias: str
+    generation: int
+    sample: int = 0
+    deadline: float = 0.0
+    scheduled: bool = False
+    stale: bool = False
+    flapping: bool = False
+    errors: int = 0
+    transitions: deque[float] = field(default_factory=deque)
+
+
+@dataclass
+class HealthMonitor:
+    """Watch the sample timestamps and request outcomes of many channels.
+
+    A channel is stale when its newest sample timestamp did not advance for
+    `stale_after` seconds, or after `error_threshold` failed requests in a
+    row. It is flapping when it changes between stale and healthy
+    `flap_threshold` times within `flap_window` seconds.
+
+    For readings, the sample timestamp is the oldest timestamp of the
+    watched `fields`, so a single field that stops updating makes the
+    channel stale. Leave out fields the device updates less often than
+    `stale_after`, like `gas_consumption`. All fields of the reading are
+    watched if not set.
+
+    Deadlines are kept in a single heap with at most one entry per channel,
+    instead of a timer or task per channel. The entry of a removed channel
+    is dropped when its deadline comes up.
+    """
+
+    stale_after: float = 60.0
+    error_threshold: int = 3
+    flap_window: float = 600.0
+    flap_threshold: int = 4
+    fields: tuple[str, ...] | None = None
+
+    _channels: dict[tuple[str, str], _Channel] = field(default_factory=dict)
+    _heap: list[tuple[float, int, str, str]] = field(default_factory=list)
+    _generations: itertools.count[int] = field(default_factory=itertools.count)
+
+    def observe(
+        self, host: str, alias: str, reading: Reading, now: float | None = None
+    ) -> list[HealthEvent]:
+        """Record a successful reading of a channel.
+
+        Args:
+            host: The host of the CEMM device.
+            alias: The channel the reading was read from.
+            reading: A SmartMeter, WaterMeter or SolarPanel object.
+            now: The current monotonic time, `time.monotonic()` if not set.
+
+        Returns:
+            The health events caused by this reading.
+        """
+        timestamps = reading.timestamps
+        if self.fields is not None:
+            timestamps = {
+                name: timestamps[name] for name in self.fields if name in timestamps
+            }
+        return self.observe_sample(
+            host, alias, min(timestamps.values(), default=0), now
+        )
+
+    def observe_sample(
+        self, host: str, alias: str, timestamp: int, now: float | None = None
+    ) -> list[HealthEvent]:
+        """Record the newest sample timestamp of a channel.
+
+        Args:
+            host: The host of the CEMM device.
+            alias: The channel the sample was read from.
+            timestamp: The sample timestamp reported by the device.
+            now: The current monotonic time, `time.monotonic()` if not set.
+
+        Returns:
+            The health events caused by this sample.
+        """
+        now = time.monotonic() if now is None else now
+        channel = self._channel(host, alias, now)
+        channel.errors = 0
+        if timestamp <= channel.sample:
+            return []
+
+        channel.sample = timestamp
+        self._schedule(channel, now)
+        if channel.stale:
+            channel.stale = False
+            return self._transition(channel, RECOVERED, "new sample", now)
+        return []
+
+    def record_error(
+        self, host: str, alias: str, now: float | None = None
+    ) -> list[HealthEvent]:
+        """Record a failed request for a channel.
+
+        Args:
+            host: The host of the CEMM device.
+            alias: The channel that could not be read.
+            now: The current monotonic time, `time.monotonic()` if not set.
+
+        Returns:
+            The health events caused by this error.
+        """
+        now = time.monotonic() if now is None else now
+        channel = self._channel(host, alias, now)
+        channel.errors += 1
+        if channel.stale or channel.errors < self.error_threshold:
+            return []
+        channel.stale = True
+        return self._transition(channel, STALE, "request errors", now)
+
+    def check(self, now: float | None = None) -> list[HealthEvent]:
+        """Find the channels whose deadline has passed.
+
+        Args:
+            now: The current monotonic time, `time.monotonic()` if not set.
+
+        Returns:
+            The health events of channels that became stale.
+        """
+        now = time.monotonic() if now is None else now
+        events: list[HealthEvent] = []
+        while self._heap and self._heap[0][0] <= now:
+            _, generation, host, alias = heapq.heappop(self._heap)
+            channel = self._channels.get((host, alias))
+            if channel is None or channel.generation != generation:
+                # The channel was removed, and maybe added again since.
+                continue
+            if channel.deadline > now:
+                # The channel got a new sample since this entry was pushed.
+                heapq.heappush(self._heap, (channel.deadline, generation, host, alias))
+                continue
+            channel.scheduled = False
+            if not channel.stale:
+                channel.stale = True
+                events += self._transition(channel, STALE, "no new samples", now)
+        return events
+
+    def next_deadline(self) -> float | None:
+        """Return the earliest moment a channel can become stale.
+
+        Returns:
+            A monotonic time, or None when no channel is watched.
+        """
+        return self._heap[0][0] if self._heap else None
+
+    def remove(self, host: str, alias: str) -> None:
+        """Stop watching a channel.
+
+        Args:
+            host: The host of the CEMM device.
+            alias: The channel to remove.
+        """
+        self._channels.pop((host, alias), None)
+
+    def stale(self) -> list[tuple[str, str]]:
+        """Get all channels that are currently stale.
+
+        Returns:
+            A list of (host, alias) tuples.
+        """
+        return [key for key, channel in self._channels.items() if channel.stale]
+
+    async def watch(self, callback: Callable[[HealthEvent], None]) -> None:
+        """Check the deadlines in the background until cancelled.
+
+        New deadlines are never earlier than the ones already scheduled, so
+        sleeping until the next deadline does not miss anything.
+
+        Args:
+            callback: Called with every health event found by `check`.
+        """
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None:
+                await asyncio.sleep(self.stale_after)
+            else:
+                await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+            for event in self.check():
+                callback(event)
+
+    def _channel(self, host: str, alias: str, now: float) -> _Channel:
+        channel = self._channels.get((host, alias))
+        if channel is None:
+            channel = self._channels[(host, alias)] = _Channel(
+                host, alias, next(self._generations)
+            )
+            self._schedule(channel, now)
+        return channel
+
+    def _schedule(self, channel: _Channel, now: float) -> None:
+        channel.deadline = now + self.stale_after
+        if not channel.scheduled:
+            channel.scheduled = True
+            heapq.heappush(
+                self._heap,
+                (channel.deadline, channel.generation, channel.host, channel.alias),
+            )
+
+    def _transition(
+        self, channel: _Channel, kind: str, reason: str, now: float
+    ) -> list[HealthEvent]:
+        events = [HealthEvent(channel.host, channel.alias, kind, reason, now)]
+        transitions = channel.transitions
+        transitions.append(now)
+        while transitions and transitions[0] < now - self.flap_window:
+            transitions.popleft()
+
+        if len(transitions) >= self.flap_threshold:
+            if not channel.flapping:
+                channel.flapping = True
+                events.append(
+                    HealthEvent(
+                        channel.host, channel.alias, FLAPPING, "unstable channel", now
+                    )
+                )
+        elif kind == RECOVERED:
+            channel.flapping = False
+        return events
@@ -0,0 +1,153 @@
+"""Parse CEMM realtime responses from declarative field specs."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any
+
+from .exceptions import CEMMParseError
+
+NUMBER = (int, float)
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """Describe where a model field is found in a realtime response.
+
+    Every path points to a `[timestamp, value]` pair, for example
+    `("totals", "t3")`. A field with two paths is the rounded sum of both
+    values and uses the timestamp of the first pair.
+    """
+
+    name: str
+    paths: tuple[tuple[str, str], ...]
+    optional: bool = False
+    types: tuple[type, ...] = NUMBER
+
+
+@dataclass
+class Parser:
+    """Parse responses for one model, resolving every path only once.
+
+    The fast mode trusts the shape of the response. The strict mode first
+    checks every path, timestamp and value type and reports all problems at
+    once. Both modes return None for optional fields that are missing, and
+    a failing fast parse is retried in strict mode to explain the failure.
+    """
+
+    model: str
+    specs: tuple[FieldSpec, ...]
+
+    _leaves: list[tuple[str, str]] = field(init=False)
+    _optional: set[tuple[str, str]] = field(init=False)
+    _types: dict[tuple[str, str], tuple[type, ...]] = field(init=False)
+    _plan: list[tuple[str, bool, tuple[int, ...]]] = field(init=False)
+
+    def __post_init__(self) -> None:
+        """Collect the unique paths of the specs."""
+        self._leaves = []
+        self._types = {}
+        required = set()
+        for spec in self.specs:
+            for path in spec.paths:
+                if path not in self._types:
+                    self._leaves.append(path)
+                    self._types[path] = spec.types
+                if not spec.optional:
+                    required.add(path)
+        self._optional = set(self._leaves) - required
+        index = {path: position for position, path in enumerate(self._leaves)}
+        self._plan = [
+            (spec.name, spec.optional, tuple(index[path] for path in spec.paths))
+            for spec in self.specs
+        ]
+
+    def parse(
+        self, data: dict[str, Any], *, strict: bool = False
+    ) -> tuple[dict[str, Any], dict[str, int]]:
+        """Get the field values and timestamps from a response.
+
+        Args:
+            data: The JSON data from the CEMM device.
+            strict: Validate the response before parsing it.
+
+        Returns:
+            A tuple with the values and the timestamps by field name.
+
+        Raises:
+            CEMMParseError: The response does not match the specs.
+        """
+        if strict:
+            self.validate(data)
+        try:
+            return self._parse(data)
+        except (KeyError, IndexError, TypeError, AttributeError) as exception:
+            self.validate(data)
+            # Valid pairs can still fail, for example a summed string value.
+            raise CEMMParseError(
+                f"Invalid {self.model} response", self.model, [repr(exception)]
+            ) from exception
+
+    def validate(self, data: Any) -> None:
+        """Check a response against the specs.
+
+        Args:
+            data: The JSON data from the CEMM device.
+
+        Raises:
+            CEMMParseError: The response does not match the specs, with a
+                list of all problems found.
+        """
+        if not isinstance(data, dict):
+            raise CEMMParseError(
+                f"Invalid {self.model} response",
+                self.model,
+                [f"expected an object, got {type(data).__name__}"],
+            )
+
+        errors: list[str] = []
+        for path in self._leaves:
+            section, key = path
+            if not isinstance(data.get(section), dict):
+                errors.append(f"{section}: missing section")
+                continue
+            pair = data[section].get(key)
+            if pair is None:
+                if path not in self._optional:
+                    errors.append(f"{section}.{key}: missing")
+            elif not isinstance(pair, list) or len(pair) != 2:
+                errors.append(f"{section}.{key}: expected a [timestamp, value] pair")
+            elif not _is(pair[0], (int,)):
+                errors.append(
+                    f"{section}.{key}[0]: expected a timestamp, got {pair[0]!r}"
+                )
+            elif not _is(pair[1], self._types[path]):
+                errors.append(f"{section}.{key}[1]: unexpected value {pair[1]!r}")
+
+        if errors:
+            # The same missing section is reported once.
+            errors = list(dict.fromkeys(errors))
+            raise CEMMParseError(
+                f"Invalid {self.model} response: {'; '.join(errors)}",
+                self.model,
+                errors,
+            )
+
+    def _parse(self, data: dict[str, Any]) -> tuple[dict[str, Any], dict[str, int]]:
+        pairs = [data[section].get(key) for section, key in self._leaves]
+        values: dict[str, Any] = {}
+        timestamps: dict[str, int] = {}
+        for name, optional, indexes in self._plan:
+            pair = pairs[indexes[0]]
+            if optional and any(pairs[index] is None for index in indexes):
+                values[name] = None
+                continue
+            if len(indexes) == 1:
+                values[name] = pair[1]
+            else:
+                values[name] = round(float(pair[1] + pairs[indexes[1]][1]), 2)
+            timestamps[name] = pair[0]
+        return values, timestamps
+
+
+def _is(value: Any, types: tuple[type, ...]) -> bool:
+    return isinstance(value, types) and not isinstance(value, bool)
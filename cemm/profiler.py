@@ -0,0 +1,346 @@
+"""Per-stage latency profiling of sweeps over CEMM devices."""
+from __future__ import annotations
+
+import cProfile
+import time
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any
+
+from aiohttp import TraceConfig
+from aiohttp.client import ClientSession
+
+# Stages of a channel read, in the order they happen.
+QUEUE = "queue"
+CONNECT = "connect"
+RESPONSE = "response"
+DECODE = "decode"
+MODEL = "model"
+SINK = "sink"
+STAGES = (QUEUE, CONNECT, RESPONSE, DECODE, MODEL, SINK)
+
+# Ways a request can fail.
+TIMEOUT = "timeout"
+ERROR = "error"
+FAILURES = (TIMEOUT, ERROR)
+
+# Upper bounds (seconds) of the histogram buckets, 1 µs up to ~20 minutes.
+_BOUNDS = [0.000001 * 1.1**index for index in range(220)]
+
+
+@dataclass
+class Span:
+    """Connection timings of a single request, filled in by the trace."""
+
+    host: str
+    alias: str
+    queue: float = 0.0
+    connect: float = 0.0
+
+
+@dataclass
+class _Histogram:
+    """Log-scaled histogram of durations, with exact count, total and max."""
+
+    counts: list[int] = field(default_factory=lambda: [0] * (len(_BOUNDS) + 1))
+    count: int = 0
+    total: float = 0.0
+    maximum: float = 0.0
+
+    def add(self, seconds: float) -> None:
+        """Add a duration."""
+        self.counts[bisect_left(_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def percentile(self, fraction: float) -> float:
+        """Return the upper bound of the bucket holding a percentile."""
+        needed = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= needed:
+                return min(_BOUNDS[min(bucket, len(_BOUNDS) - 1)], self.maximum)
+        return 0.0
+
+    def summary(self) -> dict[str, Any]:
+        """Return the count, total, percentiles and max."""
+        return {
+            "count": self.count,
+            "total": self.total,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "max": self.maximum,
+        }
+
+
+@dataclass
+class SweepProfiler:
+    """Collect the time spent in every stage of reading a channel.
+
+    Stages:
+        queue: Waiting for a free connection in the pool of the session.
+        connect: Opening a new connection to the device.
+        response: Waiting for the response headers of the device.
+        decode: Reading and decoding the JSON body.
+        model: Building the model object from the JSON data.
+        sink: Storing the reading, measured with `stage(host, alias, SINK)`.
+
+    The queue and connect stages come from an aiohttp trace, so they are
+    only measured for sessions created with `trace_config()`. Without it,
+    they are part of the response stage. For a request that timed out or
+    failed, the time until the failure counts as its response stage, and
+    the failure is counted for the host and alias.
+
+    Durations are kept in log-scaled histograms, so memory does not grow
+    with the number of requests. Percentiles are accurate to about 10%;
+    counts, totals and maximums are exact. Per channel, only the total time
+    of every stage is kept.
+    """
+
+    _stages: dict[str, _Histogram] = field(
+        default_factory=lambda: {stage: _Histogram() for stage in STAGES}
+    )
+    _channels: dict[tuple[str, str], list[float]] = field(default_factory=dict)
+    _failures: dict[tuple[str, str], dict[str, int]] = field(default_factory=dict)
+    _sweeps: _Histogram = field(default_factory=_Histogram)
+
+    def record(self, host: str, alias: str, stage: str, seconds: float) -> None:
+        """Add the duration of a stage.
+
+        Args:
+            host: The host of the CEMM device.
+            alias: The channel, or the URI for requests that are not
+                for a channel.
+            stage: One of the STAGES.
+            seconds: The duration of the stage.
+        """
+        self._stages[stage].add(seconds)
+        totals = self._channels.get((host, alias))
+        if totals is None:
+            totals = self._channels[(host, alias)] = [0.0] * len(STAGES)
+        totals[STAGES.index(stage)] += seconds
+
+    @contextmanager
+    def stage(self, host: str, alias: str, stage: str) -> Iterator[None]:
+        """Measure the duration of a stage.
+
+        Args:
+            host: The host of the CEMM device.
+            alias: The channel the stage belongs to.
+            stage: One of the STAGES.
+
+        Yields:
+            Nothing, the stage is recorded when the block exits.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(host, alias, stage, time.perf_counter() - started)
+
+    @contextmanager
+    def sweep(self, profile: str | None = None) -> Iterator[None]:
+        """Measure the duration of a sweep.
+
+        Args:
+            profile: Path to write cProfile statistics of the sweep to. The
+                pstats file can be read by snakeviz, gprof2dot or flameprof
+                to draw a flame graph. Everything that runs in this thread
+                during the sweep is profiled.
+
+        Yields:
+            Nothing, the sweep is recorded when the block exits.
+        """
+        profiler = None
+        if profile is not None:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started
+            if profile is not None and profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(profile)
+            self._sweeps.add(duration)
+
+    def span(self, host: str, uri: str) -> Span:
+        """Start the timings of a request.
+
+        Args:
+            host: The host of the CEMM device.
+            uri: The requested URI, for example 'v1/p1/realtime'.
+
+        Returns:
+            A Span to pass to the session as `trace_request_ctx`.
+        """
+        parts = uri.split("/")
+        alias = parts[1] if len(parts) == 3 and parts[2] == "realtime" else uri
+        return Span(host, alias)
+
+    def finish(self, span: Span, seconds: float, failure: str | None = None) -> None:
+        """Record the stages of a request.
+
+        Args:
+            span: The Span of the request.
+            seconds: The time from sending the request to its response, or
+                to its failure.
+            failure: TIMEOUT or ERROR when the request failed.
+        """
+        self.record(span.host, span.alias, QUEUE, span.queue)
+        self.record(span.host, span.alias, CONNECT, span.connect)
+        response = max(0.0, seconds - span.queue - span.connect)
+        self.record(span.host, span.alias, RESPONSE, response)
+        if failure is not None:
+            counts = self._failures.setdefault(
+                (span.host, span.alias), dict.fromkeys(FAILURES, 0)
+            )
+            counts[failure] += 1
+
+    def trace_config(self) -> TraceConfig:
+        """Create a trace that measures the queue and connect stages.
+
+        Returns:
+            An aiohttp TraceConfig, for the `trace_configs` of a session.
+        """
+        trace = TraceConfig()
+        trace.on_connection_queued_start.append(_start)
+        trace.on_connection_queued_end.append(_end(QUEUE))
+        trace.on_connection_create_start.append(_start)
+        trace.on_connection_create_end.append(_end(CONNECT))
+        return trace
+
+    def report(self, top: int = 5) -> dict[str, Any]:
+        """Summarize the collected timings.
+
+        Args:
+            top: The number of slowest hosts and channels to include.
+
+        Returns:
+            A JSON serializable dictionary with percentiles (seconds) of the
+            sweeps and of every stage, the number of failed requests, and the
+            hosts and channels with the most time spent, with the time per
+            stage and their failed requests.
+        """
+        hosts: dict[str, list[float]] = {}
+        host_failures: dict[str, dict[str, int]] = {}
+        for (host, alias), totals in self._channels.items():
+            summed = hosts.setdefault(host, [0.0] * len(STAGES))
+            for index, total in enumerate(totals):
+                summed[index] += total
+            failures = host_failures.setdefault(host, dict.fromkeys(FAILURES, 0))
+            for kind, count in self._failures.get((host, alias), {}).items():
+                failures[kind] += count
+
+        empty = dict.fromkeys(FAILURES, 0)
+        return {
+            "sweeps": self._sweeps.summary(),
+            "stages": {stage: self._stages[stage].summary() for stage in STAGES},
+            "failures": {
+                kind: sum(counts[kind] for counts in self._failures.values())
+                for kind in FAILURES
+            },
+            "slowest_hosts": [
+                {"host": host, **_breakdown(totals, host_failures[host])}
+                for host, totals in _slowest(hosts, top)
+            ],
+            "slowest_channels": [
+                {
+                    "host": host,
+                    "alias": alias,
+                    **_breakdown(totals, self._failures.get((host, alias), empty)),
+                }
+                for (host, alias), totals in _slowest(self._channels, top)
+            ],
+        }
+
+    def text(self, top: int = 5) -> str:
+        """Summarize the collected timings as a table.
+
+        Args:
+            top: The number of slowest hosts and channels to include.
+
+        Returns:
+            The report, with all times in milliseconds.
+        """
+        report = self.report(top)
+        header = f"{'':<24}{'count':>8}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}"
+        lines = [header]
+        rows = [("sweep", report["sweeps"]), *report["stages"].items()]
+        for name, summary in rows:
+            lines.append(
+                f"{name:<24}{summary['count']:>8}"
+                + "".join(
+                    f"{summary[key] * 1000:>10.1f}"
+                    for key in ("p50", "p90", "p99", "max")
+                )
+            )
+        failures = report["failures"]
+        lines.append(
+            f"{'failed':<24}{sum(failures.values()):>8}  "
+            + ", ".join(f"{kind} {failures[kind]}" for kind in FAILURES)
+        )
+
+        for title, entries in (
+            ("Slowest hosts", report["slowest_hosts"]),
+            ("Slowest channels", report["slowest_channels"]),
+        ):
+            lines += ["", f"{title:<24}{'total':>10}{'failed':>8}  worst stage"]
+            for entry in entries:
+                name = "/".join(
+                    [entry["host"], *([entry["alias"]] if "alias" in entry else [])]
+                )
+                stage = max(entry["stages"], key=entry["stages"].get)
+                failed = sum(entry["failures"].values())
+                lines.append(
+                    f"{name:<24}{entry['total'] * 1000:>10.1f}{failed:>8}  {stage}"
+                    f" {entry['stages'][stage] * 1000:.1f}"
+                )
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        """Remove all collected timings."""
+        self._stages = {stage: _Histogram() for stage in STAGES}
+        self._channels.clear()
+        self._failures.clear()
+        self._sweeps = _Histogram()
+
+
+async def _start(
+    _session: ClientSession, context: SimpleNamespace, _params: Any
+) -> None:
+    context.started = time.perf_counter()
+
+
+def _end(stage: str) -> Any:
+    async def end(
+        _session: ClientSession, context: SimpleNamespace, _params: Any
+    ) -> None:
+        span = context.trace_request_ctx
+        if isinstance(span, Span):
+            setattr(
+                span,
+                stage,
+                getattr(span, stage) + time.perf_counter() - context.started,
+            )
+
+    return end
+
+
+def _slowest(totals: dict[Any, list[float]], top: int) -> list[tuple[Any, list[float]]]:
+    return sorted(totals.items(), key=lambda item: sum(item[1]), reverse=True)[:top]
+
+
+def _breakdown(totals: list[float], failures: dict[str, int]) -> dict[str, Any]:
+    return {
+        "total": sum(totals),
+        "stages": dict(zip(STAGES, totals)),
+        "failures": dict(failures),
+    }
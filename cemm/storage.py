@@ -0,0 +1,219 @@
+"""SQLite storage backend for CEMM readings."""
+from __future__ import annotations
+
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from .exceptions import CEMMError
+from .models import Reading, value_fields
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    host TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    model TEXT NOT NULL,
+    field TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    value
+);
+CREATE INDEX IF NOT EXISTS idx_readings_host_alias_ts
+    ON readings (host, alias, ts);
+CREATE TABLE IF NOT EXISTS latest (
+    host TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    field TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    value,
+    PRIMARY KEY (host, alias, field)
+) WITHOUT ROWID;
+"""
+
+_INSERT_READING = (
+    "INSERT INTO readings (host, alias, model, field, ts, value) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+_UPSERT_LATEST = (
+    "INSERT INTO latest (host, alias, field, ts, value) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT (host, alias, field) DO UPDATE "
+    "SET ts = excluded.ts, value = excluded.value WHERE excluded.ts >= latest.ts"
+)
+
+
+@dataclass
+class Sample:
+    """Object representing a single stored value of a reading."""
+
+    host: str
+    alias: str
+    name: str
+    timestamp: int
+    value: Any
+
+
+@dataclass
+class SQLiteStorage:
+    """Store readings from CEMM devices in a SQLite database.
+
+    Readings are buffered in memory and written in a single transaction once
+    `batch_size` values are pending, or when `flush` is called. Values whose
+    device timestamp did not change since the previous poll are skipped, as
+    are missing values without a device timestamp.
+    """
+
+    database: str
+    batch_size: int = 500
+
+    _connection: sqlite3.Connection | None = None
+    _pending: list[tuple[str, str, str, str, int, Any]] = field(default_factory=list)
+    _seen: dict[tuple[str, str, str], int] = field(default_factory=dict)
+
+    def open(self) -> None:
+        """Open the database, enable WAL mode and create the schema."""
+        if self._connection is not None:
+            return
+        self._connection = sqlite3.connect(self.database)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def add(self, host: str, alias: str, reading: Reading) -> None:
+        """Queue all values of a reading for storage.
+
+        Args:
+            host: The host of the CEMM device.
+            alias: The channel the reading was read from.
+            reading: A SmartMeter, WaterMeter or SolarPanel object.
+        """
+        model = type(reading).__name__
+        now = int(time.time() * 1000)
+        for name in value_fields(type(reading)):
+            value = getattr(reading, name)
+            if value is None and not reading.timestamps.get(name):
+                # Not reported by this firmware, so there is nothing to store.
+                continue
+            # Values without a sample time (for example `[0, 0]`) get the poll time.
+            timestamp = reading.timestamps.get(name) or now
+            key = (host, alias, name)
+            if self._seen.get(key) == timestamp:
+                continue
+            self._seen[key] = timestamp
+            self._pending.append(
+                (
+                    host,
+                    alias,
+                    model,
+                    name,
+                    timestamp,
+                    value,
+                )
+            )
+
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all pending values in a single transaction.
+
+        Raises:
+            CEMMError: The storage has not been opened.
+        """
+        if not self._pending:
+            return
+        connection = self._require_connection()
+        rows = self._pending
+        with connection:
+            connection.executemany(_INSERT_READING, rows)
+            connection.executemany(
+                _UPSERT_LATEST,
+                [
+                    (host, alias, name, ts, value)
+                    for host, alias, _, name, ts, value in rows
+                ],
+            )
+        self._pending = []
+
+    def query(
+        self,
+        host: str,
+        alias: str,
+        start: int,
+        end: int,
+        names: list[str] | None = None,
+    ) -> list[Sample]:
+        """Get all stored values of a channel within a time range.
+
+        Args:
+            host: The host of the CEMM device.
+            alias: The channel to query.
+            start: Start of the range (inclusive), Unix timestamp in ms.
+            end: End of the range (exclusive), Unix timestamp in ms.
+            names: Only return these model fields, all fields if not set.
+
+        Returns:
+            A list of Sample objects, ordered by timestamp.
+        """
+        self.flush()
+        connection = self._require_connection()
+        sql = (
+            "SELECT field, ts, value FROM readings "
+            "WHERE host = ? AND alias = ? AND ts >= ? AND ts < ?"
+        )
+        params: list[Any] = [host, alias, start, end]
+        if names:
+            sql += f" AND field IN ({', '.join('?' * len(names))})"
+            params.extend(names)
+        sql += " ORDER BY ts"
+        return [
+            Sample(host, alias, name, ts, value)
+            for name, ts, value in connection.execute(sql, params)
+        ]
+
+    def last(self, host: str, alias: str) -> dict[str, Sample]:
+        """Get the most recent value of every field of a channel.
+
+        Args:
+            host: The host of the CEMM device.
+            alias: The channel to query.
+
+        Returns:
+            A dictionary with the field name as key and a Sample as value.
+        """
+        self.flush()
+        connection = self._require_connection()
+        rows = connection.execute(
+            "SELECT field, ts, value FROM latest WHERE host = ? AND alias = ?",
+            (host, alias),
+        )
+        return {name: Sample(host, alias, name, ts, value) for name, ts, value in rows}
+
+    def close(self) -> None:
+        """Write pending values and close the database."""
+        if self._connection is None:
+            return
+        self.flush()
+        self._connection.close()
+        self._connection = None
+
+    def _require_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            raise CEMMError("The SQLite storage has not been opened")
+        return self._connection
+
+    def __enter__(self) -> SQLiteStorage:
+        """Open the storage.
+
+        Returns:
+            The SQLiteStorage object.
+        """
+        self.open()
+        return self
+
+    def __exit__(self, *_exc_info: Any) -> None:
+        """Close the storage.
+
+        Args:
+            _exc_info: Exec type.
+        """
+        self.close()
@@ -0,0 +1,108 @@
+"""Adaptive request timeouts for CEMM devices."""
+from __future__ import annotations
+
+from bisect import bisect_left
+from dataclasses import dataclass, field
+
+# Upper bounds (seconds) of the latency buckets, 1 ms up to ~2 minutes.
+_BOUNDS = [0.001 * 1.2**index for index in range(65)]
+
+
+@dataclass
+class AdaptiveTimeout:
+    """Derive request timeouts from the observed latency of every host and URI.
+
+    Latencies are kept in a log-scaled histogram per (host, uri). Once enough
+    samples are seen, the timeout is the configured percentile times the
+    multiplier, clamped between floor and ceiling. Until then, and for
+    unknown URIs, the ceiling is used.
+
+    Timeouts are not latencies, so they are counted apart and never move the
+    deadline. A host that hangs keeps its short deadline. Every
+    `probe_every` timeouts in a row, one request gets the ceiling instead,
+    so a host that became slow but still answers can widen its deadline
+    with successful responses.
+    """
+
+    percentile: float = 0.99
+    multiplier: float = 2.0
+    floor: float = 0.5
+    ceiling: float = 10.0
+    min_samples: int = 20
+    max_samples: int = 1000
+    probe_every: int = 10
+
+    _histograms: dict[tuple[str, str], list[int]] = field(default_factory=dict)
+    _totals: dict[tuple[str, str], int] = field(default_factory=dict)
+    _timeouts: dict[tuple[str, str], int] = field(default_factory=dict)
+
+    def observe(self, host: str, uri: str, latency: float) -> None:
+        """Add the latency of a request to the histogram.
+
+        Once `max_samples` latencies are collected, all buckets are halved so
+        the histogram keeps following changes in the network.
+
+        Args:
+            host: The host of the CEMM device.
+            uri: The requested URI.
+            latency: The duration of the request in seconds.
+        """
+        key = (host, uri)
+        self._timeouts.pop(key, None)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = [0] * (len(_BOUNDS) + 1)
+            self._totals[key] = 0
+        histogram[bisect_left(_BOUNDS, latency)] += 1
+        self._totals[key] += 1
+
+        if self._totals[key] >= self.max_samples:
+            for index, count in enumerate(histogram):
+                histogram[index] = count // 2
+            self._totals[key] = sum(histogram)
+
+    def timed_out(self, host: str, uri: str) -> None:
+        """Count a request that did not get a response before its deadline.
+
+        Args:
+            host: The host of the CEMM device.
+            uri: The requested URI.
+        """
+        key = (host, uri)
+        self._timeouts[key] = self._timeouts.get(key, 0) + 1
+
+    def timeout(self, host: str, uri: str) -> float:
+        """Get the timeout for the next request.
+
+        Args:
+            host: The host of the CEMM device.
+            uri: The URI that will be requested.
+
+        Returns:
+            The timeout in seconds.
+        """
+        key = (host, uri)
+        total = self._totals.get(key, 0)
+        if total < self.min_samples:
+            return self.ceiling
+        timeouts = self._timeouts.get(key, 0)
+        if timeouts and timeouts % self.probe_every == 0:
+            return self.ceiling
+
+        needed = self.percentile * total
+        seen = 0
+        bucket = 0
+        for bucket, count in enumerate(self._histograms[key]):
+            seen += count
+            if seen >= needed:
+                break
+        latency = _BOUNDS[min(bucket, len(_BOUNDS) - 1)]
+        return min(self.ceiling, max(self.floor, latency * self.multiplier))
+
+    def learned(self) -> dict[tuple[str, str], float]:
+        """Get the current timeout of every known host and URI.
+
+        Returns:
+            A dictionary with (host, uri) as key and the timeout as value.
+        """
+        return {key: self.timeout(*key) for key in self._histograms}
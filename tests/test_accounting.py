@@ -0,0 +1,161 @@
+"""Test the energy accounting engine."""
+import pytest
+
+from cemm import EnergyAccounting, SmartMeter
+
+# 2021-09-29 21:00:00 UTC, aligned to every interval used below.
+START = 1632949200000
+
+
+def reading(
+    offset: int,
+    consumption: float,
+    returned: float = 0.0,
+    tariff: int = 1,
+    billed_offset: int = 0,
+) -> SmartMeter:
+    """Create a SmartMeter reading, `offset` seconds after the start."""
+    smartmeter = SmartMeter(
+        power_flow=0,
+        gas_consumption=None,
+        energy_tariff_period=str(tariff),
+        energy_consumption_low=consumption,
+        energy_consumption_high=10.0,
+        energy_returned_low=returned,
+        energy_returned_high=20.0,
+        billed_energy_low=consumption,
+        billed_energy_high=30.0,
+    )
+    timestamp = START + offset * 1000
+    smartmeter.timestamps = {
+        "energy_consumption_low": timestamp,
+        "energy_consumption_high": timestamp,
+        "energy_returned_low": timestamp,
+        "energy_returned_high": timestamp,
+        "billed_energy_low": timestamp + billed_offset * 1000,
+        "billed_energy_high": timestamp + billed_offset * 1000,
+    }
+    return smartmeter
+
+
+def test_interpolation_at_bucket_edges() -> None:
+    """Test energy between two readings is split at the bucket edge."""
+    accounting = EnergyAccounting(intervals=(900,))
+    assert not accounting.add(reading(600, 100.0))
+
+    buckets = accounting.add(reading(1200, 100.6, returned=0.3))
+    assert len(buckets) == 1
+    assert buckets[0].start == START
+    assert buckets[0].end == START + 900_000
+    assert buckets[0].registers["energy_consumption_low"] == pytest.approx(0.3)
+    assert buckets[0].registers["energy_consumption_high"] == 0
+    assert buckets[0].consumption == {"1": pytest.approx(0.3)}
+    assert buckets[0].returned == {"1": pytest.approx(0.15)}
+
+    remaining = accounting.flush()
+    assert [bucket.start for bucket in remaining] == [START + 900_000]
+    assert remaining[0].registers["energy_consumption_low"] == pytest.approx(0.3)
+    assert not accounting.flush()
+
+
+def test_tariff_periods() -> None:
+    """Test energy is booked on the tariff of the start of each segment."""
+    accounting = EnergyAccounting(intervals=(3600,))
+    buckets = accounting.add_many(
+        [
+            reading(0, 100.0, tariff=1),
+            reading(1800, 101.0, tariff=2),
+            reading(3600, 103.0, tariff=2),
+        ]
+    )
+    assert len(buckets) == 1
+    assert buckets[0].consumption == {"1": 1.0, "2": 2.0}
+    assert buckets[0].registers["billed_energy_low"] == 3.0
+
+
+def test_multiple_intervals_and_gaps() -> None:
+    """Test a gap spanning many buckets is spread over all of them."""
+    accounting = EnergyAccounting(intervals=(900, 3600))
+    accounting.add(reading(0, 100.0))
+    buckets = accounting.add(reading(7200, 108.0))
+
+    quarters = [bucket for bucket in buckets if bucket.interval == 900]
+    hours = [bucket for bucket in buckets if bucket.interval == 3600]
+    assert len(quarters) == 8
+    assert len(hours) == 2
+    assert all(
+        bucket.registers["energy_consumption_low"] == pytest.approx(1.0)
+        for bucket in quarters
+    )
+    assert all(
+        bucket.registers["energy_consumption_low"] == pytest.approx(4.0)
+        for bucket in hours
+    )
+    assert buckets == sorted(buckets, key=lambda bucket: bucket.start)
+
+
+def test_waits_for_every_register() -> None:
+    """Test a bucket stays open until every register has passed its end."""
+    accounting = EnergyAccounting(intervals=(900,))
+    accounting.add(reading(60, 100.0, billed_offset=-60))
+    assert not accounting.add(reading(900, 101.0, billed_offset=-60))
+
+    buckets = accounting.add(reading(960, 101.1, billed_offset=-60))
+    assert len(buckets) == 1
+    assert buckets[0].registers["energy_consumption_low"] == pytest.approx(1.0)
+    assert buckets[0].registers["billed_energy_low"] == pytest.approx(1.1)
+
+
+def test_lagging_register() -> None:
+    """Test a register that stops updating does not keep buckets open."""
+    accounting = EnergyAccounting(intervals=(900,), max_lag=1800)
+    completed = []
+    for offset in range(0, 3 * 3600 + 1, 60):
+        completed += accounting.add(
+            reading(offset, 100.0 + offset / 3600, billed_offset=-offset)
+        )
+        # pylint: disable-next=protected-access
+        assert len(accounting._open.get(900, ())) <= 3
+    assert [bucket.start for bucket in completed] == [
+        START + index * 900000 for index in range(12)
+    ]
+
+    # The billed registers catch up: their energy of the completed intervals
+    # is returned in extra buckets.
+    late = accounting.add(reading(3 * 3600 + 60, 103.1))
+    assert [bucket.start for bucket in late][:12] == [
+        START + index * 900000 for index in range(12)
+    ]
+    assert set(late[0].registers) == {"billed_energy_low", "billed_energy_high"}
+    billed = [
+        bucket.registers.get("billed_energy_low", 0.0)
+        for bucket in late + accounting.flush()
+    ]
+    assert sum(billed) == pytest.approx(3.1)
+
+
+def test_reset_and_missing_values() -> None:
+    """Test a register reset, missing values and old readings are skipped."""
+    accounting = EnergyAccounting(intervals=(900,))
+    empty = reading(0, 0.0)
+    empty.timestamps = {}
+    assert not accounting.add(empty)
+
+    accounting.add(reading(0, 100.0))
+    accounting.add(reading(300, 0.5))
+    accounting.add(reading(300, 0.6))
+    buckets = accounting.add(reading(900, 1.5))
+    assert buckets[0].registers["energy_consumption_low"] == pytest.approx(1.0)
+
+
+def test_utc_offset() -> None:
+    """Test daily buckets follow the local day."""
+    accounting = EnergyAccounting(intervals=(86400,), utc_offset=7200)
+    accounting.add(reading(0, 100.0))
+    buckets = accounting.add(reading(7200, 102.0)) + accounting.flush()
+    # 21:00 UTC is 23:00 local time, the local day ends at 22:00 UTC.
+    assert [bucket.start for bucket in buckets] == [
+        START - 82800_000,
+        START + 3600_000,
+    ]
+    assert [bucket.consumption["1"] for bucket in buckets] == [1.0, 1.0]
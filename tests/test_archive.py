@@ -0,0 +1,149 @@
+"""Test the memory-mapped reading archive."""
+import json
+from pathlib import Path
+
+import pytest
+
+from cemm import ArchiveReader, ArchiveWriter, SmartMeter, WaterMeter
+from cemm.exceptions import CEMMError
+
+from . import load_fixtures
+
+
+def watermeter(timestamp: int, volume: float) -> WaterMeter:
+    """Create a WaterMeter reading."""
+    reading = WaterMeter(flow=1.5, volume=volume)
+    reading.timestamps = {"flow": timestamp, "volume": timestamp}
+    return reading
+
+
+def write_archive(path: Path, count: int) -> None:
+    """Write a reading every minute, starting at timestamp 60000."""
+    with ArchiveWriter(str(path), WaterMeter) as writer:
+        for index in range(1, count + 1):
+            writer.append(watermeter(index * 60000, 598.0 + index / 100))
+
+
+def test_value_at(tmp_path: Path) -> None:
+    """Test random access by time."""
+    path = tmp_path / "pulse-1.cemm"
+    write_archive(path, 100)
+
+    with ArchiveReader(str(path)) as reader:
+        assert len(reader) == 100
+        assert reader.model is WaterMeter
+        assert reader.value_at(59999) is None
+
+        reading = reader.value_at(60000)
+        assert reading == WaterMeter(flow=1.5, volume=598.01)
+        assert reading is not None
+        assert reading.timestamps == {"flow": 60000, "volume": 60000}
+
+        assert reader.value_at(150000) == reader.read(1)
+        assert reader.value_at(10**12) == reader.read(-1)
+        assert reader.timestamp(99) == 6000000
+        with pytest.raises(IndexError):
+            reader.read(100)
+
+
+def test_range(tmp_path: Path) -> None:
+    """Test range queries return a view on the archive."""
+    numpy = pytest.importorskip("numpy")
+    path = tmp_path / "pulse-1.cemm"
+    write_archive(path, 100)
+
+    reader = ArchiveReader(str(path))
+    reader.open()
+    records = reader.range(120000, 300000)
+    assert list(records["timestamp"]) == [120000, 180000, 240000]
+    assert records["volume"] == pytest.approx([598.02, 598.03, 598.04])
+    assert records.dtype.names == ("timestamp", "flow", "volume")
+    assert not records.flags.owndata
+    assert not records.flags.writeable
+    assert len(reader.range(0, 60000)) == 0
+    assert numpy.isclose(reader.range(0, 10**12)["volume"].max(), 599.0)
+    del records
+    reader.close()
+
+
+def test_append_to_existing(tmp_path: Path) -> None:
+    """Test appending continues an existing archive."""
+    path = tmp_path / "p1.cemm"
+    smartmeter = SmartMeter.from_dict(json.loads(load_fixtures("smartmeter.json")))
+    smartmeter.gas_consumption = None
+    with ArchiveWriter(str(path), SmartMeter) as writer:
+        writer.append(smartmeter)
+        writer.append(smartmeter, timestamp=1632948531000)
+
+    # Simulate an interrupted write.
+    with open(path, "ab") as handle:
+        handle.write(b"\1\2\3")
+
+    with ArchiveWriter(str(path), SmartMeter) as writer:
+        with pytest.raises(CEMMError):
+            writer.append(smartmeter, timestamp=1632948500000)
+        writer.append(smartmeter, timestamp=1632948600000)
+
+    with ArchiveReader(str(path)) as reader:
+        assert len(reader) == 3
+        reading = reader.read(0)
+        assert reading == smartmeter
+        assert reading.gas_consumption is None
+        assert reader.timestamp(2) == 1632948600000
+
+
+def test_integer_columns(tmp_path: Path) -> None:
+    """Test integer fields and the tariff period keep integer values."""
+    numpy = pytest.importorskip("numpy")
+    path = tmp_path / "p1.cemm"
+    smartmeter = SmartMeter.from_dict(json.loads(load_fixtures("smartmeter.json")))
+    missing = SmartMeter.from_dict(json.loads(load_fixtures("smartmeter.json")))
+    missing.power_flow = None
+    missing.energy_tariff_period = None
+    with ArchiveWriter(str(path), SmartMeter) as writer:
+        smartmeter.energy_tariff_period = "1"
+        writer.append(smartmeter)
+        writer.append(missing, timestamp=1632948600000)
+        for tariff in ("high", 1.5):
+            smartmeter.energy_tariff_period = tariff  # type: ignore[assignment]
+            with pytest.raises(CEMMError):
+                writer.append(smartmeter, timestamp=1632948600000)
+
+    with ArchiveReader(str(path)) as reader:
+        reading = reader.read(0)
+        assert isinstance(reading, SmartMeter)
+        assert reading.power_flow == 193
+        assert isinstance(reading.power_flow, int)
+        assert reading.energy_tariff_period == 1
+        assert reader.read(1) == missing
+
+        records = reader.range(0, 10**13)
+        assert records["power_flow"].dtype == numpy.dtype("<i8")
+        assert list(records["power_flow"]) == [193, -(2**63)]
+        del records
+
+
+def test_errors(tmp_path: Path) -> None:
+    """Test invalid archives and values."""
+    path = tmp_path / "pulse-1.cemm"
+    write_archive(path, 1)
+
+    with pytest.raises(CEMMError):
+        ArchiveWriter(str(path), SmartMeter).open()
+    with ArchiveWriter(str(path), WaterMeter) as writer:
+        with pytest.raises(CEMMError):
+            writer.append(watermeter(120000, "a lot"))  # type: ignore[arg-type]
+    with pytest.raises(CEMMError):
+        ArchiveWriter(str(path), WaterMeter).append(watermeter(120000, 1.0))
+    with pytest.raises(CEMMError):
+        ArchiveReader(str(path)).timestamp(0)
+
+    (tmp_path / "empty.cemm").write_bytes(b"")
+    with pytest.raises(CEMMError):
+        ArchiveReader(str(tmp_path / "empty.cemm")).open()
+    (tmp_path / "other.cemm").write_bytes(b"CEMS\1\0\0\0")
+    with pytest.raises(CEMMError):
+        ArchiveReader(str(tmp_path / "other.cemm")).open()
+    (tmp_path / "old.cemm").write_bytes(b"CEMA\1\0\x10\0GasMeter")
+    with pytest.raises(CEMMError):
+        ArchiveReader(str(tmp_path / "old.cemm")).open()
@@ -0,0 +1,104 @@
+"""Test the binary codec for reading streams."""
+import json
+from dataclasses import replace
+from typing import Any
+
+import pytest
+
+from cemm import SmartMeter, SolarPanel, StreamDecoder, StreamEncoder, WaterMeter
+from cemm.codec import decode_stream, encode_stream
+from cemm.exceptions import CEMMError
+
+from . import load_fixtures
+
+
+def smartmeter_stream(count: int) -> list[SmartMeter]:
+    """Create a stream of smart meter readings, one every second."""
+    data = json.loads(load_fixtures("smartmeter.json"))
+    readings = []
+    for index in range(count):
+        for key in ("t1", "t2", "electric_power", "rate", "gas"):
+            data["data"][key][0] += 1000
+        data["data"]["t1"][1] = round(data["data"]["t1"][1] + 0.01 * (index % 3), 2)
+        data["data"]["electric_power"][1] = 193 + index % 7 - 3
+        data["data"]["rate"][1] = 1 if index < count // 2 else 2
+        readings.append(SmartMeter.from_dict(data))
+    return readings
+
+
+def test_roundtrip() -> None:
+    """Test readings survive encoding and decoding."""
+    readings = smartmeter_stream(100)
+    readings[10] = replace(
+        readings[10], gas_consumption=None, energy_tariff_period="normal"
+    )
+    readings[10].timestamps = readings[9].timestamps
+
+    data = encode_stream(readings)
+    decoded = decode_stream(data)
+    assert decoded == readings
+    assert [item.timestamps for item in decoded] == [
+        item.timestamps for item in readings
+    ]
+    assert len(data) < len(json.dumps([vars(item) for item in readings])) / 10
+
+
+@pytest.mark.parametrize(
+    ("model", "fixture"),
+    [(SolarPanel, "solarpanel.json"), (WaterMeter, "watermeter.json")],
+)
+def test_models(model: Any, fixture: str) -> None:
+    """Test streams of the other models."""
+    reading = model.from_dict(json.loads(load_fixtures(fixture)))
+    assert decode_stream(encode_stream([reading, reading])) == [reading, reading]
+
+
+def test_missing_timestamps() -> None:
+    """Test fields without a timestamp have none after decoding."""
+    readings = smartmeter_stream(3)
+    data = json.loads(load_fixtures("smartmeter.json"))
+    for key in ("electric_power", "rate", "gas"):
+        del data["data"][key]
+    readings[1] = SmartMeter.from_dict(data)
+    assert "power_flow" not in readings[1].timestamps
+
+    decoded = decode_stream(encode_stream(readings))
+    assert decoded == readings
+    assert [item.timestamps for item in decoded] == [
+        item.timestamps for item in readings
+    ]
+
+
+def test_chunked_decode() -> None:
+    """Test the stream can be decoded while it arrives byte by byte."""
+    readings = smartmeter_stream(20)
+    encoder = StreamEncoder(SmartMeter)
+    decoder = StreamDecoder()
+    decoded = []
+    for reading in readings:
+        for byte in encoder.encode(reading):
+            decoded.extend(decoder.feed(bytes([byte])))
+    assert decoded == readings
+    assert decoder.model is SmartMeter
+
+
+def test_encode_errors() -> None:
+    """Test values that cannot be encoded."""
+    encoder = StreamEncoder(WaterMeter)
+    with pytest.raises(CEMMError):
+        encoder.encode(smartmeter_stream(1)[0])
+    with pytest.raises(CEMMError):
+        encoder.encode(WaterMeter(flow=[1], volume=2.0))  # type: ignore[arg-type]
+    with pytest.raises(CEMMError):
+        encode_stream([])
+
+
+def test_decode_errors() -> None:
+    """Test streams that cannot be decoded."""
+    with pytest.raises(CEMMError):
+        decode_stream(b"JSON{}")
+
+    header = bytearray(StreamEncoder(WaterMeter).header())
+    header[6:16] = b"GasMeter.."
+    with pytest.raises(CEMMError):
+        decode_stream(bytes(header))
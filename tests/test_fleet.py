@@ -0,0 +1,236 @@
+"""Test the multi-process fleet runner."""
+import asyncio
+import json
+import queue
+from typing import Any, Optional
+
+import aiohttp
+import pytest
+from aresponses import ResponsesMockServer
+
+from cemm import CEMM, Fleet, FleetReading, SmartMeter
+from cemm.exceptions import CEMMError
+from cemm.fleet import _decode, _encode, _run_worker, _sweep, shard_for
+
+from . import ALIAS_SMARTMETER, ALIAS_WATERMETER, load_fixtures
+
+
+def test_shard_for() -> None:
+    """Test only the hosts of a new worker move when the pool grows."""
+    hosts = [f"10.0.0.{index}" for index in range(200)]
+    before = {host: shard_for(host, 4) for host in hosts}
+    after = {host: shard_for(host, 5) for host in hosts}
+
+    assert before == {host: shard_for(host, 4) for host in hosts}
+    assert set(before.values()) == {0, 1, 2, 3}
+    moved = [host for host in hosts if before[host] != after[host]]
+    assert moved
+    assert all(after[host] == 4 for host in moved)
+
+
+def test_encode_decode() -> None:
+    """Test a reading survives the compact inter-process format."""
+    smartmeter = SmartMeter.from_dict(json.loads(load_fixtures("smartmeter.json")))
+    item = _encode("example.com", ALIAS_SMARTMETER, "smartmeter", smartmeter)
+    result = _decode(item)
+
+    assert result == FleetReading("example.com", ALIAS_SMARTMETER, smartmeter)
+    assert result.reading is not None
+    assert result.reading.timestamps == smartmeter.timestamps
+
+
+def test_encode_decode_missing_timestamps() -> None:
+    """Test fields without a timestamp have none after decoding."""
+    data = json.loads(load_fixtures("smartmeter.json"))
+    for key in ("electric_power", "rate", "gas"):
+        del data["data"][key]
+    smartmeter = SmartMeter.from_dict(data)
+    assert "gas_consumption" not in smartmeter.timestamps
+
+    result = _decode(_encode("example.com", ALIAS_SMARTMETER, "smartmeter", smartmeter))
+    assert result.reading == smartmeter
+    assert result.reading is not None
+    assert result.reading.timestamps == smartmeter.timestamps
+
+
+@pytest.mark.asyncio
+async def test_sweep(aresponses: ResponsesMockServer) -> None:
+    """Test a worker sweep over multiple channels of a device."""
+    aresponses.add(
+        "example.com",
+        f"/open-api/v1/{ALIAS_SMARTMETER}/realtime",
+        "GET",
+        aresponses.Response(
+            text=load_fixtures("smartmeter.json"),
+            status=200,
+            headers={"Content-Type": "application/json; charset=utf-8"},
+        ),
+    )
+    aresponses.add(
+        "example.com",
+        f"/open-api/v1/{ALIAS_WATERMETER}/realtime",
+        "GET",
+        aresponses.Response(text="Give me water!", status=500),
+    )
+
+    async with aiohttp.ClientSession() as session:
+        clients = {"example.com": CEMM("example.com", session=session)}
+        items = await _sweep(
+            clients,
+            {
+                "example.com": {
+                    ALIAS_SMARTMETER: "smartmeter",
+                    ALIAS_WATERMETER: "watermeter",
+                }
+            },
+        )
+
+    results = [_decode(item) for item in items]
+    assert isinstance(results[0].reading, SmartMeter)
+    assert results[0].reading.power_flow == 193
+    assert results[1].reading is None
+    assert results[1].error is not None
+    assert results[1].error.startswith("CEMMConnectionError")
+
+
+def test_unknown_kind() -> None:
+    """Test adding a channel of an unknown kind."""
+    fleet = Fleet(workers=2)
+    with pytest.raises(CEMMError):
+        fleet.add_host("example.com", {"p1": "gasmeter"})
+
+
+def test_rebalance_without_workers() -> None:
+    """Test host assignment when adding, removing and resizing."""
+    fleet = Fleet(workers=2)
+    for index in range(20):
+        fleet.add_host(f"10.0.0.{index}", {ALIAS_SMARTMETER: "smartmeter"})
+    fleet.remove_host("10.0.0.0")
+    fleet.remove_host("10.0.0.0")
+    fleet.resize(3)
+
+    # pylint: disable=protected-access
+    assert len(fleet._hosts) == 19
+    assert fleet._assignment == {host: shard_for(host, 3) for host in fleet._hosts}
+
+
+class FailingQueue(queue.Queue):  # type: ignore[type-arg]
+    """A queue that fails to accept the first batch."""
+
+    failed = False
+
+    def put(
+        self, item: Any, block: bool = True, timeout: Optional[float] = None
+    ) -> None:
+        """Fail once, then put items on the queue."""
+        if not self.failed:
+            self.failed = True
+            raise ValueError("Cannot pickle")
+        super().put(item, block, timeout)
+
+
+async def get(results: queue.Queue) -> Any:  # type: ignore[type-arg]
+    """Get the next batch of a worker without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, results.get, True, 5)
+
+
+def add_channels(aresponses: ResponsesMockServer) -> None:
+    """Add a smart meter and a water meter with a malformed body."""
+    aresponses.add(
+        "example.com",
+        f"/open-api/v1/{ALIAS_SMARTMETER}/realtime",
+        "GET",
+        aresponses.Response(
+            text=load_fixtures("smartmeter.json"),
+            headers={"Content-Type": "application/json; charset=utf-8"},
+        ),
+        repeat=100,
+    )
+    aresponses.add(
+        "example.com",
+        f"/open-api/v1/{ALIAS_WATERMETER}/realtime",
+        "GET",
+        aresponses.Response(
+            text="{broken", headers={"Content-Type": "application/json"}
+        ),
+        repeat=100,
+    )
+
+
+@pytest.mark.asyncio
+async def test_worker(aresponses: ResponsesMockServer) -> None:
+    """Test the worker loop handles its control messages and bad responses."""
+    add_channels(aresponses)
+    control: queue.Queue[Any] = queue.Queue()
+    results: queue.Queue[Any] = queue.Queue()
+    worker = asyncio.create_task(
+        _run_worker(control, results, 0.05, 1, 1)  # type: ignore[arg-type]
+    )
+    control.put(
+        (
+            "add",
+            "example.com",
+            {ALIAS_SMARTMETER: "smartmeter", ALIAS_WATERMETER: "watermeter"},
+        )
+    )
+
+    # The new host is polled right away and then on every interval.
+    batches = [await get(results) for _ in range(4)]
+    assert all(len(batch) == 1 for batch in batches)
+    readings = [_decode(batch[0]) for batch in batches]
+    by_alias = {reading.alias: reading for reading in readings}
+    smartmeter = by_alias[ALIAS_SMARTMETER].reading
+    assert isinstance(smartmeter, SmartMeter)
+    assert smartmeter.power_flow == 193
+    error = by_alias[ALIAS_WATERMETER].error
+    assert error is not None
+    assert error.startswith("JSONDecodeError")
+
+    control.put(("remove", "example.com"))
+    control.put(("stop",))
+    await asyncio.wait_for(worker, 5)
+
+
+@pytest.mark.asyncio
+async def test_worker_survives_failed_sweep(aresponses: ResponsesMockServer) -> None:
+    """Test a sweep that fails does not stop the worker."""
+    add_channels(aresponses)
+    control: queue.Queue[Any] = queue.Queue()
+    results = FailingQueue()
+    worker = asyncio.create_task(
+        _run_worker(control, results, 0.05, 1, 10)  # type: ignore[arg-type]
+    )
+    control.put(("add", "example.com", {ALIAS_SMARTMETER: "smartmeter"}))
+
+    batch = await get(results)
+    assert results.failed
+    assert _decode(batch[0]).alias == ALIAS_SMARTMETER
+    control.put(("stop",))
+    await asyncio.wait_for(worker, 5)
+    assert worker.exception() is None
+
+
+@pytest.mark.asyncio
+async def test_fleet_processes() -> None:
+    """Test readings from worker processes reach the parent process."""
+    fleet = Fleet(workers=1, interval=60, request_timeout=1)
+    # An invalid host name fails before any network traffic.
+    fleet.add_host("invalid host", {ALIAS_SMARTMETER: "smartmeter"})
+    with fleet:
+        fleet.resize(2)
+        result = await asyncio.wait_for(fleet.readings().__anext__(), 30)
+        assert result.host == "invalid host"
+        assert result.alias == ALIAS_SMARTMETER
+        assert result.reading is None
+        assert result.error
+        fleet.resize(1)
+
+    remaining = [item async for item in fleet.readings()]
+    assert all(item.host == "invalid host" for item in remaining)
+
+
+@pytest.mark.asyncio
+async def test_not_started() -> None:
+    """Test reading from a fleet that has not been started."""
+    with pytest.raises(CEMMError):
+        await Fleet(workers=1).readings().__anext__()
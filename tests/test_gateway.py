@@ -0,0 +1,187 @@
+"""Test the HTTP gateway."""
+import asyncio
+import json
+
+import aiohttp
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from aresponses import ResponsesMockServer
+
+from cemm import Gateway
+from cemm.exceptions import CEMMError
+
+from . import ALIAS_SMARTMETER, ALIAS_WATERMETER, load_fixtures
+
+
+def add_device(aresponses: ResponsesMockServer, host: str) -> None:
+    """Add the responses of a CEMM device with a smart meter."""
+    for path, fixture in (
+        ("/open-api/v1", "device.json"),
+        ("/open-api/v1/io", "connections.json"),
+        (f"/open-api/v1/{ALIAS_SMARTMETER}/realtime", "smartmeter.json"),
+    ):
+        aresponses.add(
+            host,
+            path,
+            "GET",
+            aresponses.Response(
+                text=load_fixtures(fixture),
+                status=200,
+                headers={"Content-Type": "application/json; charset=utf-8"},
+            ),
+        )
+    aresponses.add(
+        host,
+        f"/open-api/v1/{ALIAS_WATERMETER}/realtime",
+        "GET",
+        aresponses.Response(text="Give me water!", status=500),
+    )
+
+
+@pytest.mark.asyncio
+async def test_cached_endpoints() -> None:
+    """Test the gateway serves the polled values with ETags."""
+    gateway = Gateway(
+        {
+            "example.com": {
+                ALIAS_SMARTMETER: "smartmeter",
+                ALIAS_WATERMETER: "watermeter",
+            }
+        }
+    )
+    async with ResponsesMockServer() as aresponses:
+        add_device(aresponses, "example.com")
+        await gateway.refresh()
+
+    async with TestClient(TestServer(gateway.application())) as client:
+        response = await client.get(f"/devices/example.com/{ALIAS_SMARTMETER}")
+        assert response.status == 200
+        data = await response.json()
+        assert data["power_flow"] == 193
+        assert data["timestamps"]["power_flow"] == 1632948526000
+        etag = response.headers["ETag"]
+
+        response = await client.get(
+            f"/devices/example.com/{ALIAS_SMARTMETER}",
+            headers={"If-None-Match": f'"other", {etag}'},
+        )
+        assert response.status == 304
+        assert response.headers["ETag"] == etag
+
+        response = await client.get("/devices/example.com")
+        assert (await response.json())["model"] == "CEMM Plus"
+        response = await client.get("/devices/example.com/connections")
+        assert [item["alias"] for item in await response.json()] == ["p1", "emucs-gas"]
+
+        response = await client.get("/devices")
+        devices = await response.json()
+        assert devices[0]["host"] == "example.com"
+        assert devices[0]["updated"]
+        assert devices[0]["errors"][0].startswith(
+            f"/devices/example.com/{ALIAS_WATERMETER}: CEMMConnectionError"
+        )
+
+        response = await client.get(f"/devices/example.com/{ALIAS_WATERMETER}")
+        assert response.status == 404
+        response = await client.get("/devices/unknown.com")
+        assert response.status == 404
+
+    await gateway.close()
+
+
+@pytest.mark.asyncio
+async def test_etag_follows_values() -> None:
+    """Test the ETag only changes when the device reports new values."""
+    async with aiohttp.ClientSession() as session:
+        gateway = Gateway({"example.com": {}}, session=session)
+        async with ResponsesMockServer() as aresponses:
+            add_device(aresponses, "example.com")
+            add_device(aresponses, "example.com")
+            await gateway.refresh()
+            first = gateway._cache["/devices/example.com"]  # pylint: disable=W0212
+            await gateway.refresh()
+            second = gateway._cache["/devices/example.com"]  # pylint: disable=W0212
+    assert first is second
+
+
+@pytest.mark.asyncio
+async def test_start_and_close() -> None:
+    """Test the gateway server and poll schedule."""
+    async with ResponsesMockServer() as aresponses:
+        add_device(aresponses, "example.com")
+        async with Gateway({"example.com": {}}, interval=60) as gateway:
+            await gateway.start(port=0)
+    assert gateway._poller is None  # pylint: disable=protected-access
+
+
+@pytest.mark.asyncio
+async def test_malformed_response() -> None:
+    """Test a device with a malformed body does not stop the others."""
+    gateway = Gateway({"broken.com": {}, "example.com": {}})
+    async with ResponsesMockServer() as aresponses:
+        for path in ("/open-api/v1", "/open-api/v1/io"):
+            aresponses.add(
+                "broken.com",
+                path,
+                "GET",
+                aresponses.Response(
+                    text="{broken",
+                    headers={"Content-Type": "application/json"},
+                ),
+            )
+        add_device(aresponses, "example.com")
+        await gateway.refresh()
+    await gateway.close()
+
+    # pylint: disable=protected-access
+    devices = json.loads(gateway._cache["/devices"].body)
+    assert [device["host"] for device in devices] == ["broken.com", "example.com"]
+    assert devices[0]["updated"] is None
+    assert devices[0]["errors"][0].startswith("/devices/broken.com: JSONDecodeError")
+    assert devices[1]["updated"]
+    assert "/devices/example.com" in gateway._cache
+
+
+@pytest.mark.asyncio
+async def test_poll_survives_failed_refresh() -> None:
+    """Test the poll schedule keeps running after a failed refresh."""
+    gateway = Gateway({}, interval=0.01)
+    calls = 0
+
+    async def refresh() -> None:
+        nonlocal calls
+        calls += 1
+        raise RuntimeError("Boom")
+
+    gateway.refresh = refresh  # type: ignore[method-assign]
+    task = asyncio.create_task(gateway._poll())  # pylint: disable=W0212
+    await asyncio.sleep(0.1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert calls > 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_device_fails() -> None:
+    """Test an unexpected error while refreshing a device is reported."""
+    gateway = Gateway({"example.com": {}}, session=aiohttp.ClientSession())
+
+    async def refresh_device(_: str) -> None:
+        raise ValueError("Boom")
+
+    # pylint: disable-next=protected-access
+    gateway._refresh_device = refresh_device  # type: ignore[assignment]
+    await gateway.refresh()
+    await gateway.session.close()  # type: ignore[union-attr]
+    # pylint: disable-next=protected-access
+    devices = json.loads(gateway._cache["/devices"].body)
+    assert devices == [
+        {"host": "example.com", "updated": None, "errors": ["ValueError: Boom"]}
+    ]
+
+
+def test_unknown_kind() -> None:
+    """Test configuring a channel of an unknown kind."""
+    with pytest.raises(CEMMError):
+        Gateway({"example.com": {"p1": "gasmeter"}})
@@ -79,6 +79,8 @@ async def test_smartmeter(aresponses: ResponsesMockServer) -> None:
         assert smartmeter.billed_energy_high == 447
         assert smartmeter.energy_consumption_high == 5459.44
         assert smartmeter.energy_returned_high == 5012.44
+        assert smartmeter.timestamps["power_flow"] == 1632948526000
+        assert smartmeter.timestamps["billed_energy_high"] == 1632948531000
 
 
 @pytest.mark.asyncio
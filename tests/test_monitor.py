@@ -0,0 +1,137 @@
+"""Test the health and staleness monitor."""
+import asyncio
+import json
+
+import pytest
+
+from cemm import HealthEvent, HealthMonitor, SmartMeter
+
+from . import ALIAS_SMARTMETER, load_fixtures
+
+
+def test_stale_and_recovered() -> None:
+    """Test a channel with a frozen sample timestamp becomes stale."""
+    monitor = HealthMonitor(stale_after=60)
+    smartmeter = SmartMeter.from_dict(json.loads(load_fixtures("smartmeter.json")))
+    assert not monitor.observe("example.com", ALIAS_SMARTMETER, smartmeter, now=0)
+    assert monitor.next_deadline() == 60
+
+    # Polling keeps working, but the device reports the same sample.
+    assert not monitor.observe("example.com", ALIAS_SMARTMETER, smartmeter, now=30)
+    assert not monitor.check(now=59)
+    events = monitor.check(now=60)
+    assert events == [
+        HealthEvent("example.com", ALIAS_SMARTMETER, "stale", "no new samples", 60)
+    ]
+    assert monitor.stale() == [("example.com", ALIAS_SMARTMETER)]
+    assert monitor.next_deadline() is None
+
+    events = monitor.observe_sample(
+        "example.com", ALIAS_SMARTMETER, 1632948600000, now=90
+    )
+    assert [event.kind for event in events] == ["recovered"]
+    assert not monitor.stale()
+    assert monitor.next_deadline() == 150
+
+
+def test_new_samples_postpone_deadline() -> None:
+    """Test a channel with advancing samples never becomes stale."""
+    monitor = HealthMonitor(stale_after=60)
+    for second in range(0, 600, 10):
+        monitor.observe_sample("example.com", "p1", 1000 + second, now=second)
+        assert not monitor.check(now=second)
+    # pylint: disable-next=protected-access
+    assert len(monitor._heap) == 1
+
+
+def test_frozen_field() -> None:
+    """Test a single field that stops updating makes the channel stale."""
+    monitor = HealthMonitor(stale_after=60)
+    smartmeter = SmartMeter.from_dict(json.loads(load_fixtures("smartmeter.json")))
+    frozen = smartmeter.timestamps["energy_consumption_low"]
+    for second in range(0, 120, 10):
+        smartmeter.timestamps = {
+            name: frozen if name == "energy_consumption_low" else timestamp + 1000
+            for name, timestamp in smartmeter.timestamps.items()
+        }
+        monitor.observe("example.com", ALIAS_SMARTMETER, smartmeter, now=second)
+    assert [event.kind for event in monitor.check(now=120)] == ["stale"]
+
+    # Only the watched fields count.
+    monitor = HealthMonitor(stale_after=60, fields=("power_flow",))
+    for second in range(0, 120, 10):
+        smartmeter.timestamps = {
+            name: frozen if name == "energy_consumption_low" else timestamp + 1000
+            for name, timestamp in smartmeter.timestamps.items()
+        }
+        monitor.observe("example.com", ALIAS_SMARTMETER, smartmeter, now=second)
+        assert not monitor.check(now=second)
+
+
+def test_remove_and_add_again() -> None:
+    """Test a channel that is added again has a single heap entry."""
+    monitor = HealthMonitor(stale_after=60)
+    monitor.observe_sample("example.com", "p1", 1000, now=0)
+    monitor.remove("example.com", "p1")
+    monitor.observe_sample("example.com", "p1", 2000, now=30)
+
+    # The entry of the removed channel is dropped without an event.
+    assert not monitor.check(now=60)
+    # pylint: disable-next=protected-access
+    assert len(monitor._heap) == 1
+    events = monitor.check(now=90)
+    assert [event.kind for event in events] == ["stale"]
+    assert not monitor.check(now=1000)
+
+
+def test_request_errors() -> None:
+    """Test consecutive request errors mark a channel stale."""
+    monitor = HealthMonitor(error_threshold=3)
+    monitor.observe_sample("example.com", "p1", 1000, now=0)
+    assert not monitor.record_error("example.com", "p1", now=1)
+    monitor.observe_sample("example.com", "p1", 1000, now=2)
+    assert not monitor.record_error("example.com", "p1", now=3)
+    assert not monitor.record_error("example.com", "p1", now=4)
+    events = monitor.record_error("example.com", "p1", now=5)
+    assert [(event.kind, event.reason) for event in events] == [
+        ("stale", "request errors")
+    ]
+    assert not monitor.record_error("example.com", "p1", now=6)
+    # A failing channel is not reported twice when its deadline passes.
+    assert not monitor.check(now=120)
+    assert not monitor.record_error("example.com", "unknown", now=7)
+
+
+def test_flapping() -> None:
+    """Test a channel that keeps going stale and recovering is flapping."""
+    monitor = HealthMonitor(stale_after=10, flap_window=100, flap_threshold=4)
+    kinds = []
+    now = 0.0
+    for sample in range(1, 4):
+        events = monitor.observe_sample("h", "p1", sample, now)
+        kinds += [event.kind for event in events]
+        now += 10
+        kinds += [event.kind for event in monitor.check(now)]
+    assert kinds == ["stale", "recovered", "stale", "recovered", "flapping", "stale"]
+
+    # Once the channel is stable again, it can be reported as flapping again.
+    now += 1000
+    kinds = [event.kind for event in monitor.observe_sample("h", "p1", 10, now)]
+    assert kinds == ["recovered"]
+    monitor.remove("h", "p1")
+    assert not monitor.check(now + 100)
+    assert not monitor.stale()
+
+
+@pytest.mark.asyncio
+async def test_watch() -> None:
+    """Test the background task reports stale channels."""
+    monitor = HealthMonitor(stale_after=0.05)
+    events: list[HealthEvent] = []
+    monitor.observe_sample("example.com", "p1", 1000)
+    task = asyncio.create_task(monitor.watch(events.append))
+    await asyncio.sleep(0.2)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert [event.kind for event in events] == ["stale"]
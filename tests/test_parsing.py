@@ -0,0 +1,138 @@
+"""Test the fast and strict parsing modes of the models."""
+import json
+
+import aiohttp
+import pytest
+from aresponses import ResponsesMockServer
+
+from cemm import CEMM, SmartMeter, SolarPanel, WaterMeter
+from cemm.exceptions import CEMMError, CEMMParseError
+from cemm.parsing import FieldSpec, Parser
+
+from . import ALIAS_SMARTMETER, load_fixtures
+
+
+@pytest.mark.parametrize("strict", [False, True])
+def test_modes_agree(strict: bool) -> None:
+    """Test both modes give the same models for valid responses."""
+    solarpanel = SolarPanel.from_dict(
+        json.loads(load_fixtures("solarpanel.json")), strict=strict
+    )
+    assert solarpanel.device_consumption_total == 37.91
+    assert solarpanel.timestamps["device_consumption_total"] == 1632955888000
+
+    watermeter = WaterMeter.from_dict(
+        json.loads(load_fixtures("watermeter.json")), strict=strict
+    )
+    assert watermeter.volume == 598.44
+    assert watermeter.timestamps == {"flow": 0, "volume": 1632956000000}
+
+
+@pytest.mark.parametrize("strict", [False, True])
+def test_missing_optional_fields(strict: bool) -> None:
+    """Test firmware without gas, power and tariff period."""
+    data = json.loads(load_fixtures("smartmeter.json"))
+    for key in ("gas", "electric_power", "rate"):
+        del data["data"][key]
+
+    smartmeter = SmartMeter.from_dict(data, strict=strict)
+    assert smartmeter.gas_consumption is None
+    assert smartmeter.power_flow is None
+    assert smartmeter.energy_tariff_period is None
+    assert "gas_consumption" not in smartmeter.timestamps
+    assert smartmeter.energy_consumption_high == 5459.44
+
+
+@pytest.mark.parametrize("strict", [False, True])
+def test_missing_required_fields(strict: bool) -> None:
+    """Test a missing required field is reported with its path."""
+    data = json.loads(load_fixtures("solarpanel.json"))
+    del data["totals"]["t3"]
+    data["totals"]["t4"] = [1632955888000]
+
+    with pytest.raises(CEMMParseError) as excinfo:
+        SolarPanel.from_dict(data, strict=strict)
+    assert isinstance(excinfo.value, CEMMError)
+    assert excinfo.value.model == "SolarPanel"
+    assert excinfo.value.errors == [
+        "totals.t3: missing",
+        "totals.t4: expected a [timestamp, value] pair",
+    ]
+
+
+def test_strict_types() -> None:
+    """Test strict mode checks timestamps and values."""
+    data = json.loads(load_fixtures("smartmeter.json"))
+    data["data"]["t1"] = ["yesterday", 5237.19]
+    data["data"]["t2"] = [1632948526000, "5459.44"]
+    data["data"]["rate"] = [1632948526000, "normal"]
+    del data["totals"]
+
+    with pytest.raises(CEMMParseError) as excinfo:
+        SmartMeter.from_dict(data, strict=True)
+    assert excinfo.value.errors == [
+        "data.t1[0]: expected a timestamp, got 'yesterday'",
+        "data.t2[1]: unexpected value '5459.44'",
+        "totals: missing section",
+    ]
+
+    with pytest.raises(CEMMParseError) as excinfo:
+        SmartMeter.from_dict([], strict=True)  # type: ignore[arg-type]
+    assert excinfo.value.errors == ["expected an object, got list"]
+
+
+def test_fast_mode_unexpected_shape() -> None:
+    """Test fast mode reports a failure the specs do not explain."""
+    data = json.loads(load_fixtures("watermeter.json"))
+    data["totals"]["volume"] = [1632956000000, None]
+    # Values are not type checked in fast mode.
+    assert WaterMeter.from_dict(data).volume is None
+
+    data = json.loads(load_fixtures("solarpanel.json"))
+    data["totals"]["t3"] = [1632955888000, "27.42"]
+    with pytest.raises(CEMMParseError) as excinfo:
+        SolarPanel.from_dict(data)
+    assert excinfo.value.errors == ["totals.t3[1]: unexpected value '27.42'"]
+
+
+def test_summed_fields() -> None:
+    """Test optional sums and sums that fail after validation."""
+    parser = Parser(
+        "Meter",
+        (
+            FieldSpec("total", (("data", "t1"), ("data", "t2")), optional=True),
+            FieldSpec("rate", (("data", "r1"), ("data", "r2")), types=(int, str)),
+        ),
+    )
+    values, timestamps = parser.parse(
+        {"data": {"t1": [1000, 1.5], "r1": [1000, 1], "r2": [1000, 2]}}
+    )
+    assert values == {"total": None, "rate": 3}
+    assert timestamps == {"rate": 1000}
+
+    with pytest.raises(CEMMParseError) as excinfo:
+        parser.parse({"data": {"r1": [1000, 1], "r2": [1000, "high"]}})
+    assert excinfo.value.model == "Meter"
+    assert "TypeError" in excinfo.value.errors[0]
+
+
+@pytest.mark.asyncio
+async def test_strict_client(aresponses: ResponsesMockServer) -> None:
+    """Test the client parses responses in strict mode."""
+    data = json.loads(load_fixtures("smartmeter.json"))
+    del data["data"]["t4"]
+    aresponses.add(
+        "example.com",
+        f"/open-api/v1/{ALIAS_SMARTMETER}/realtime",
+        "GET",
+        aresponses.Response(
+            text=json.dumps(data),
+            status=200,
+            headers={"Content-Type": "application/json; charset=utf-8"},
+        ),
+    )
+
+    async with aiohttp.ClientSession() as session:
+        client = CEMM(host="example.com", session=session, strict=True)
+        with pytest.raises(CEMMParseError, match="data.t4: missing"):
+            await client.smartmeter(ALIAS_SMARTMETER)
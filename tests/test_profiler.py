@@ -0,0 +1,135 @@
+"""Test the sweep profiler."""
+import asyncio
+import json
+import pstats
+from pathlib import Path
+
+import aiohttp
+import pytest
+from aresponses import Response, ResponsesMockServer
+
+from cemm import CEMM, SweepProfiler
+from cemm.exceptions import CEMMConnectionError
+from cemm.profiler import SINK, STAGES
+
+from . import ALIAS_SMARTMETER, ALIAS_WATERMETER, load_fixtures
+
+
+def test_report() -> None:
+    """Test percentiles and the slowest hosts and channels."""
+    profiler = SweepProfiler()
+    for index in range(1, 101):
+        profiler.record("fast.local", "p1", "response", index / 10000)
+    profiler.record("slow.local", "p1", "response", 0.5)
+    profiler.record("slow.local", "pulse-1", "sink", 1.0)
+
+    report = profiler.report(top=2)
+    assert report["stages"]["response"]["count"] == 101
+    assert report["stages"]["response"]["p50"] == pytest.approx(0.0051, rel=0.1)
+    assert report["stages"]["response"]["p99"] == pytest.approx(0.01, rel=0.1)
+    assert report["stages"]["response"]["max"] == 0.5
+    assert report["stages"]["queue"] == {
+        "count": 0,
+        "total": 0.0,
+        "p50": 0.0,
+        "p90": 0.0,
+        "p99": 0.0,
+        "max": 0.0,
+    }
+    assert [entry["host"] for entry in report["slowest_hosts"]] == [
+        "slow.local",
+        "fast.local",
+    ]
+    assert report["slowest_hosts"][0]["total"] == 1.5
+    assert [
+        (entry["host"], entry["alias"]) for entry in report["slowest_channels"]
+    ] == [("slow.local", "pulse-1"), ("fast.local", "p1")]
+    assert report["slowest_channels"][0]["stages"]["sink"] == 1.0
+
+    text = profiler.text(top=1)
+    assert "slow.local/pulse-1" in text
+    assert "fast.local/p1" not in text
+    assert "sink 1000.0" in text
+
+    # Memory does not grow with the number of timings.
+    histogram = profiler._stages["response"]  # pylint: disable=protected-access
+    size = len(histogram.counts)
+    for _ in range(10000):
+        profiler.record("fast.local", "p1", "response", 0.001)
+    assert len(histogram.counts) == size
+    assert profiler.report()["stages"]["response"]["count"] == 10101
+
+    profiler.reset()
+    assert profiler.report()["slowest_hosts"] == []
+
+
+@pytest.mark.asyncio
+async def test_profile_sweep(aresponses: ResponsesMockServer, tmp_path: Path) -> None:
+    """Test a profiled sweep measures every stage of every channel."""
+    for alias, fixture in (
+        (ALIAS_SMARTMETER, "smartmeter.json"),
+        (ALIAS_WATERMETER, "watermeter.json"),
+    ):
+        aresponses.add(
+            "example.com",
+            f"/open-api/v1/{alias}/realtime",
+            "GET",
+            aresponses.Response(
+                text=load_fixtures(fixture),
+                headers={"Content-Type": "application/json"},
+            ),
+        )
+
+    profiler = SweepProfiler()
+    stored = []
+    path = tmp_path / "sweep.pstats"
+    async with CEMM("example.com", profiler=profiler) as client:
+        with profiler.sweep(profile=str(path)):
+            readings = await asyncio.gather(
+                client.smartmeter(ALIAS_SMARTMETER),
+                client.watermeter(ALIAS_WATERMETER),
+            )
+            for alias, reading in zip((ALIAS_SMARTMETER, ALIAS_WATERMETER), readings):
+                with profiler.stage("example.com", alias, SINK):
+                    stored.append(reading)
+
+    report = profiler.report()
+    assert report["sweeps"]["count"] == 1
+    for stage in STAGES:
+        assert report["stages"][stage]["count"] == 2
+    assert report["stages"]["connect"]["total"] > 0
+    assert {entry["alias"] for entry in report["slowest_channels"]} == {
+        ALIAS_SMARTMETER,
+        ALIAS_WATERMETER,
+    }
+    assert json.loads(json.dumps(report)) == report
+
+    stats = pstats.Stats(str(path))
+    assert stats.total_calls > 0  # type: ignore[attr-defined]
+
+
+@pytest.mark.asyncio
+async def test_profile_timeout(aresponses: ResponsesMockServer) -> None:
+    """Test a request that timed out is recorded with its time and a count."""
+
+    async def response_handler(_: aiohttp.ClientResponse) -> Response:
+        await asyncio.sleep(0.2)
+        return aresponses.Response(text=load_fixtures("smartmeter.json"))
+
+    aresponses.add("example.com", "/open-api/v1/p1/realtime", "GET", response_handler)
+
+    profiler = SweepProfiler()
+    async with CEMM("example.com", request_timeout=0.1, profiler=profiler) as client:
+        with pytest.raises(CEMMConnectionError):
+            await client.smartmeter("p1")
+
+    report = profiler.report()
+    assert report["stages"]["response"]["count"] == 1
+    assert report["failures"] == {"timeout": 1, "error": 0}
+    host = report["slowest_hosts"][0]
+    assert host["host"] == "example.com"
+    assert host["failures"] == {"timeout": 1, "error": 0}
+    assert host["total"] >= 0.1
+    channel = report["slowest_channels"][0]
+    assert (channel["alias"], channel["failures"]["timeout"]) == ("p1", 1)
+    assert "timeout 1, error 0" in profiler.text()
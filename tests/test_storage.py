@@ -0,0 +1,96 @@
+"""Test the SQLite storage backend."""
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from cemm import SmartMeter, SQLiteStorage, WaterMeter
+from cemm.exceptions import CEMMError
+
+from . import ALIAS_SMARTMETER, ALIAS_WATERMETER, load_fixtures
+
+
+def test_store_and_query(tmp_path: Path) -> None:
+    """Test readings are stored with their device timestamps."""
+    smartmeter = SmartMeter.from_dict(json.loads(load_fixtures("smartmeter.json")))
+    with SQLiteStorage(str(tmp_path / "cemm.db"), batch_size=100) as storage:
+        storage.add("example.com", ALIAS_SMARTMETER, smartmeter)
+        # A second poll with unchanged timestamps is not stored again.
+        storage.add("example.com", ALIAS_SMARTMETER, smartmeter)
+
+        samples = storage.query(
+            "example.com", ALIAS_SMARTMETER, 1632948526000, 1632948527000
+        )
+        assert len(samples) == 7
+        assert {sample.timestamp for sample in samples} == {1632948526000}
+
+        samples = storage.query(
+            "example.com",
+            ALIAS_SMARTMETER,
+            0,
+            2000000000000,
+            names=["billed_energy_high"],
+        )
+        assert len(samples) == 1
+        assert samples[0].timestamp == 1632948531000
+        assert samples[0].value == 447
+
+        last = storage.last("example.com", ALIAS_SMARTMETER)
+        assert last["energy_consumption_high"].value == 5459.44
+        assert storage.last("example.com", "unknown") == {}
+
+    connection = sqlite3.connect(tmp_path / "cemm.db")
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert connection.execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 9
+
+
+def test_batched_writes(tmp_path: Path) -> None:
+    """Test values are only written once a batch is complete."""
+    data = json.loads(load_fixtures("watermeter.json"))
+    data["data"]["flow"] = [1632956000000, 0]
+    storage = SQLiteStorage(str(tmp_path / "cemm.db"), batch_size=4)
+    storage.open()
+    connection = sqlite3.connect(tmp_path / "cemm.db")
+
+    storage.add("example.com", ALIAS_WATERMETER, WaterMeter.from_dict(data))
+    assert connection.execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 0
+
+    data["data"]["flow"] = [1632956060000, 1.5]
+    data["totals"]["volume"] = [1632956060000, 598.5]
+    storage.add("example.com", ALIAS_WATERMETER, WaterMeter.from_dict(data))
+    assert connection.execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 4
+
+    data["totals"]["volume"] = [1632956120000, 598.6]
+    storage.add("example.com", ALIAS_WATERMETER, WaterMeter.from_dict(data))
+    assert connection.execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 4
+
+    last = storage.last("example.com", ALIAS_WATERMETER)
+    assert last["volume"].timestamp == 1632956120000
+    assert last["volume"].value == 598.6
+    assert connection.execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 5
+    storage.close()
+    storage.close()
+
+
+def test_missing_values(tmp_path: Path) -> None:
+    """Test values the firmware does not report are not stored."""
+    data = json.loads(load_fixtures("smartmeter.json"))
+    del data["data"]["gas"]
+    smartmeter = SmartMeter.from_dict(data)
+    with SQLiteStorage(str(tmp_path / "cemm.db")) as storage:
+        for _ in range(3):
+            storage.add("example.com", ALIAS_SMARTMETER, smartmeter)
+        storage.flush()
+
+        samples = storage.query("example.com", ALIAS_SMARTMETER, 0, 2000000000000)
+        assert len(samples) == 8
+        assert "gas_consumption" not in {sample.name for sample in samples}
+        assert "gas_consumption" not in storage.last("example.com", ALIAS_SMARTMETER)
+
+
+def test_not_opened() -> None:
+    """Test using the storage before opening it."""
+    storage = SQLiteStorage(":memory:")
+    with pytest.raises(CEMMError):
+        storage.last("example.com", ALIAS_SMARTMETER)
@@ -0,0 +1,126 @@
+"""Test the adaptive request timeouts."""
+import asyncio
+
+import aiohttp
+import pytest
+from aresponses import Response, ResponsesMockServer
+
+from cemm import CEMM, AdaptiveTimeout
+from cemm.exceptions import CEMMConnectionError
+
+from . import ALIAS_SMARTMETER, load_fixtures
+
+
+def test_ceiling_until_learned() -> None:
+    """Test the ceiling is used until enough samples are seen."""
+    adaptive = AdaptiveTimeout(min_samples=5, ceiling=8)
+    assert adaptive.timeout("example.com", "v1") == 8
+    for _ in range(4):
+        adaptive.observe("example.com", "v1", 0.05)
+    assert adaptive.timeout("example.com", "v1") == 8
+
+    adaptive.observe("example.com", "v1", 0.05)
+    assert adaptive.timeout("example.com", "v1") < 8
+    assert adaptive.timeout("example.com", "v1/io") == 8
+
+
+def test_percentile_floor_and_ceiling() -> None:
+    """Test the timeout follows the percentile within its limits."""
+    adaptive = AdaptiveTimeout(min_samples=10, floor=0.5, ceiling=10)
+    for _ in range(100):
+        adaptive.observe("fast", "v1", 0.01)
+        adaptive.observe("slow", "v1", 1.0)
+        adaptive.observe("hanging", "v1", 60.0)
+
+    assert adaptive.timeout("fast", "v1") == 0.5
+    assert 2.0 <= adaptive.timeout("slow", "v1") <= 2.5
+    assert adaptive.timeout("hanging", "v1") == 10
+    assert adaptive.learned() == {
+        ("fast", "v1"): 0.5,
+        ("slow", "v1"): adaptive.timeout("slow", "v1"),
+        ("hanging", "v1"): 10,
+    }
+
+
+def test_decay() -> None:
+    """Test old samples lose weight once the histogram is full."""
+    adaptive = AdaptiveTimeout(min_samples=10, max_samples=100, floor=0.01)
+    for _ in range(99):
+        adaptive.observe("example.com", "v1", 1.0)
+    for _ in range(1000):
+        adaptive.observe("example.com", "v1", 0.1)
+    assert adaptive.timeout("example.com", "v1") < 0.5
+
+
+def test_hanging_host() -> None:
+    """Test timeouts of a hanging host do not raise its deadline."""
+    adaptive = AdaptiveTimeout(floor=0.5, ceiling=10, probe_every=10)
+    for _ in range(500):
+        adaptive.observe("example.com", "v1", 0.02)
+
+    deadlines = []
+    for _ in range(40):
+        deadlines.append(adaptive.timeout("example.com", "v1"))
+        adaptive.timed_out("example.com", "v1")
+    # Only one in every 10 requests probes with the ceiling.
+    assert deadlines.count(10) == 3
+    assert all(deadline == 0.5 for deadline in deadlines if deadline != 10)
+
+
+def test_slow_host_widens_deadline() -> None:
+    """Test a host that became slow learns a wider deadline from a probe."""
+    adaptive = AdaptiveTimeout(
+        min_samples=5, max_samples=20, floor=0.1, ceiling=10, probe_every=3
+    )
+    for _ in range(20):
+        adaptive.observe("example.com", "v1", 0.02)
+    assert adaptive.timeout("example.com", "v1") == 0.1
+
+    # The host now needs 3 seconds: requests time out until a probe succeeds.
+    for _ in range(10):
+        deadline = adaptive.timeout("example.com", "v1")
+        if deadline >= 3:
+            adaptive.observe("example.com", "v1", 3)
+        else:
+            adaptive.timed_out("example.com", "v1")
+    assert adaptive.timeout("example.com", "v1") >= 3
+
+
+@pytest.mark.asyncio
+async def test_client_observes_latency(aresponses: ResponsesMockServer) -> None:
+    """Test the client learns from its requests and timeouts."""
+
+    async def response_handler(_: aiohttp.ClientResponse) -> Response:
+        await asyncio.sleep(0.2)
+        return aresponses.Response(
+            text=load_fixtures("smartmeter.json"),
+            headers={"Content-Type": "application/json"},
+        )
+
+    aresponses.add(
+        "example.com",
+        f"/open-api/v1/{ALIAS_SMARTMETER}/realtime",
+        "GET",
+        aresponses.Response(
+            text=load_fixtures("smartmeter.json"),
+            headers={"Content-Type": "application/json"},
+        ),
+    )
+    aresponses.add(
+        "example.com",
+        f"/open-api/v1/{ALIAS_SMARTMETER}/realtime",
+        "GET",
+        response_handler,
+    )
+
+    adaptive = AdaptiveTimeout(min_samples=1, floor=0.1, ceiling=0.1)
+    async with aiohttp.ClientSession() as session:
+        client = CEMM("example.com", session=session, adaptive_timeout=adaptive)
+        await client.smartmeter(ALIAS_SMARTMETER)
+        with pytest.raises(CEMMConnectionError):
+            await client.smartmeter(ALIAS_SMARTMETER)
+
+    key = ("example.com", f"v1/{ALIAS_SMARTMETER}/realtime")
+    # pylint: disable=protected-access
+    assert adaptive._totals == {key: 1}
+    assert adaptive._timeouts == {key: 1}